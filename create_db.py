@@ -6,6 +6,9 @@
 
 import sqlite3
 import os
+import re
+import unicodedata
+from storage import StorageSettings, enable_journal_mode
 
 def create_database():
     """Создает базу данных SQLite с таблицами согласно требованиям"""
@@ -14,6 +17,9 @@ def create_database():
     conn = sqlite3.connect('bookstore.db')
     cursor = conn.cursor()
     
+    # Режим журнала (по умолчанию WAL) сохраняется в файле базы
+    enable_journal_mode(conn, StorageSettings.load())
+    
     print("Создание базы данных...")
     
     # Создаем таблицы согласно нормализации до 3НФ
@@ -74,6 +80,9 @@ def create_database():
         discount_price DECIMAL(10,2),
         cover_image VARCHAR(255),
         description TEXT,
+        title_norm VARCHAR(255),
+        author_norm VARCHAR(100),
+        article VARCHAR(20),
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (genre_id) REFERENCES genres(id),
         FOREIGN KEY (publisher_id) REFERENCES publishers(id)
@@ -90,6 +99,7 @@ def create_database():
         total_amount DECIMAL(10,2) NOT NULL,
         order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         completion_date TIMESTAMP,
+        pickup_code VARCHAR(20),
         FOREIGN KEY (user_id) REFERENCES users(id),
         FOREIGN KEY (pickup_point_id) REFERENCES pickup_points(id)
     )
@@ -114,17 +124,266 @@ def create_database():
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_genre ON books(genre_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)')
+    create_catalog_indexes(cursor)
+    
+    # Полнотекстовый индекс для поиска книг
+    create_search_index(cursor)
     
     print("Таблицы созданы успешно")
     
+    # Нормализованные поля и ключ уникальности книг
+    create_normalized_columns(cursor)
+    
+    # Поля и журнал для импорта из Excel
+    create_import_tables(cursor)
+    
+    # Правки заказов из интерфейса
+    create_order_overrides(cursor)
+    
     # Добавляем тестовые данные
     add_test_data(cursor)
     
+    # Журнал изменений для других копий приложения (тестовые данные в него не попадают)
+    create_change_tracking(cursor)
+    
     conn.commit()
     conn.close()
     
     print("База данных создана: bookstore.db")
 
+def create_catalog_indexes(cursor):
+    """Создает составные индексы для постраничного вывода каталога.
+    
+    Сортировки по названию и автору обслуживают idx_books_title и idx_books_author:
+    SQLite хранит rowid (id книги) последним полем любого индекса.
+    """
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_price_id ON books(price, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_year_id ON books(year DESC, id DESC)')
+
+def normalize_text(text):
+    """Нормализует текст для поиска: регистр, ё -> е, без знаков препинания"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFC', str(text)).casefold().replace('ё', 'е')
+    text = re.sub(r'[^\w\s]|_', ' ', text)
+    return ' '.join(text.split())
+
+def create_normalized_columns(cursor):
+    """Добавляет в books нормализованные колонки для поиска и заполняет пустые значения"""
+    cursor.execute('PRAGMA table_info(books)')
+    columns = {row[1] for row in cursor.fetchall()}
+    if 'title_norm' not in columns:
+        cursor.execute('ALTER TABLE books ADD COLUMN title_norm VARCHAR(255)')
+    if 'author_norm' not in columns:
+        cursor.execute('ALTER TABLE books ADD COLUMN author_norm VARCHAR(100)')
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_title_norm ON books(title_norm)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_author_norm ON books(author_norm)')
+    
+    # Книги, добавленные в обход приложения (например, SQL-скриптом).
+    # Ключ заполняется у всех книг, поэтому дубликаты не попадают в каталог
+    cursor.execute('SELECT id, title, author FROM books WHERE title_norm IS NULL OR author_norm IS NULL')
+    rows = cursor.fetchall()
+    if rows:
+        # Уникальный индекс (например, из database_deployment.sql) не дал бы заполнить ключ дубликатам.
+        # Он создается заново ниже, если дубликатов нет
+        cursor.execute('DROP INDEX IF EXISTS idx_books_unique_title_author')
+        cursor.executemany('UPDATE books SET title_norm = ?, author_norm = ? WHERE id = ?',
+                           [(normalize_text(title), normalize_text(author), book_id)
+                            for book_id, title, author in rows])
+    
+    # Пара (название, автор) в нормализованном виде - ключ уникальности книги
+    try:
+        cursor.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_books_unique_title_author
+                          ON books(title_norm, author_norm)''')
+    except sqlite3.IntegrityError:
+        # В базе уже есть дубликаты - каталог отфильтрует их запросом
+        print("В каталоге есть повторяющиеся книги, уникальный индекс не создан")
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_title_author ON books(title_norm, author_norm)')
+
+def create_import_tables(cursor):
+    """Добавляет поля для данных из Excel файлов и журнал импорта"""
+    cursor.execute('PRAGMA table_info(books)')
+    if 'article' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute('ALTER TABLE books ADD COLUMN article VARCHAR(20)')
+    cursor.execute('PRAGMA table_info(orders)')
+    order_columns = {row[1] for row in cursor.fetchall()}
+    if 'pickup_code' not in order_columns:
+        cursor.execute('ALTER TABLE orders ADD COLUMN pickup_code VARCHAR(20)')
+    if 'external_number' not in order_columns:
+        cursor.execute('ALTER TABLE orders ADD COLUMN external_number INTEGER')
+    
+    # Артикул - ключ книги при повторном импорте
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_books_article ON books(article)')
+    # Номер заказа из Excel - ключ заказа при повторном импорте, id остается своим
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_external_number ON orders(external_number)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id)')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS excel_imports (
+        source VARCHAR(50) PRIMARY KEY,
+        rows_imported INTEGER NOT NULL,
+        imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Хеши импортированных строк - для повторного импорта только изменений
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS excel_row_hashes (
+        source VARCHAR(50) NOT NULL,
+        row_key VARCHAR(50) NOT NULL,
+        row_hash CHAR(40) NOT NULL,
+        PRIMARY KEY (source, row_key)
+    ) WITHOUT ROWID
+    ''')
+    
+    if 'external_number' not in order_columns:
+        # Раньше номер заказа из Excel записывался прямо в id
+        cursor.execute('''
+            UPDATE orders SET external_number = id
+            WHERE id IN (SELECT CAST(row_key AS INTEGER) FROM excel_row_hashes WHERE source = 'orders')
+        ''')
+
+def create_order_overrides(cursor):
+    """Создает таблицы правок заказов, сделанных в интерфейсе.
+    
+    order_overrides - правки заказов из базы (по orders.id),
+    excel_order_overrides - правки заказов из Excel, которых нет в базе
+    (по номеру заказа в файле, после импорта это orders.external_number).
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'excel_order_overrides'")
+    migrate = cursor.fetchone() is None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS order_overrides (
+        order_id INTEGER PRIMARY KEY,
+        status VARCHAR(20),
+        delivery_date VARCHAR(20),
+        pickup_code VARCHAR(20),
+        client_name VARCHAR(100),
+        composition TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS excel_order_overrides (
+        external_number INTEGER PRIMARY KEY,
+        status VARCHAR(20),
+        delivery_date VARCHAR(20),
+        pickup_code VARCHAR(20),
+        client_name VARCHAR(100),
+        composition TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    if migrate:
+        # Раньше правки заказов из Excel хранились в order_overrides под номером заказа
+        columns = 'status, delivery_date, pickup_code, client_name, composition, updated_at'
+        orphaned = 'order_id NOT IN (SELECT id FROM orders)'
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO excel_order_overrides (external_number, {columns})
+            SELECT order_id, {columns} FROM order_overrides WHERE {orphaned}
+        ''')
+        cursor.execute(f'DELETE FROM order_overrides WHERE {orphaned}')
+
+# Таблицы, изменения которых видят другие копии приложения: таблица -> id записи в журнале
+WATCHED_TABLES = {
+    'books': 'id',
+    'users': 'id',
+    'orders': 'id',
+    'order_items': 'order_id',
+    'order_overrides': 'order_id',
+    'excel_order_overrides': 'external_number',
+}
+
+def create_change_tracking(cursor):
+    """Создает журнал изменений и счетчики изменений по таблицам.
+    
+    Триггеры записывают в change_log id измененной строки (для позиций
+    и правок заказа - id заказа) и увеличивают счетчик таблицы в change_counters.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS change_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name VARCHAR(30) NOT NULL,
+        row_id INTEGER,
+        action VARCHAR(10) NOT NULL,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS change_counters (
+        table_name VARCHAR(30) PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''')
+    
+    for table, key in WATCHED_TABLES.items():
+        cursor.execute('INSERT OR IGNORE INTO change_counters (table_name, version) VALUES (?, 0)', (table,))
+        for action, row in (('insert', 'new'), ('update', 'new'), ('delete', 'old')):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_log_{action} AFTER {action.upper()} ON {table} BEGIN
+                INSERT INTO change_log (table_name, row_id, action) VALUES ('{table}', {row}.{key}, '{action}');
+                UPDATE change_counters SET version = version + 1 WHERE table_name = '{table}';
+            END
+            ''')
+
+def create_search_index(cursor):
+    """Создает полнотекстовый индекс FTS5 по книгам и триггеры синхронизации.
+    
+    Возвращает False, если SQLite собран без поддержки FTS5.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'")
+    exists = cursor.fetchone() is not None
+    
+    if exists:
+        # Индекс старого формата строился по исходным названию и автору
+        cursor.execute('PRAGMA table_info(books_fts)')
+        if 'title_norm' not in {row[1] for row in cursor.fetchall()}:
+            for trigger in ('books_fts_insert', 'books_fts_delete', 'books_fts_update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute('DROP TABLE books_fts')
+            exists = False
+    
+    try:
+        cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title_norm, author_norm, description,
+            content='books', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''')
+    except sqlite3.OperationalError:
+        return False
+    
+    # Триггеры поддерживают индекс в актуальном состоянии
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts (rowid, title_norm, author_norm, description)
+        VALUES (new.id, new.title_norm, new.author_norm, new.description);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts (books_fts, rowid, title_norm, author_norm, description)
+        VALUES ('delete', old.id, old.title_norm, old.author_norm, old.description);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title_norm, author_norm, description ON books BEGIN
+        INSERT INTO books_fts (books_fts, rowid, title_norm, author_norm, description)
+        VALUES ('delete', old.id, old.title_norm, old.author_norm, old.description);
+        INSERT INTO books_fts (rowid, title_norm, author_norm, description)
+        VALUES (new.id, new.title_norm, new.author_norm, new.description);
+    END
+    ''')
+    
+    # Для уже существующей базы заполняем индекс текущими книгами
+    if not exists:
+        cursor.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+    
+    return True
+
 def add_test_data(cursor):
     """Добавляет тестовые данные в базу"""
     
@@ -215,9 +474,9 @@ def add_test_data(cursor):
     ]
     
     cursor.executemany('''
-        INSERT OR IGNORE INTO books (title, author, genre_id, publisher_id, year, price, stock_quantity, is_on_sale, discount_price, cover_image, description) 
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', books_data)
+        INSERT OR IGNORE INTO books (title, author, genre_id, publisher_id, year, price, stock_quantity, is_on_sale, discount_price, cover_image, description, title_norm, author_norm) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [book + (normalize_text(book[0]), normalize_text(book[1])) for book in books_data])
     
     # Добавляем тестовые заказы
     orders_data = [
@@ -48,6 +48,9 @@ CREATE TABLE IF NOT EXISTS books (
     discount_price DECIMAL(10,2),
     cover_image VARCHAR(255),
     description TEXT,
+    title_norm VARCHAR(255),
+    author_norm VARCHAR(100),
+    article VARCHAR(20),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (genre_id) REFERENCES genres(id),
     FOREIGN KEY (publisher_id) REFERENCES publishers(id)
@@ -62,6 +65,8 @@ CREATE TABLE IF NOT EXISTS orders (
     total_amount DECIMAL(10,2) NOT NULL,
     order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     completion_date TIMESTAMP,
+    pickup_code VARCHAR(20),
+    external_number INTEGER,
     FOREIGN KEY (user_id) REFERENCES users(id),
     FOREIGN KEY (pickup_point_id) REFERENCES pickup_points(id)
 );
@@ -83,6 +88,74 @@ CREATE INDEX IF NOT EXISTS idx_books_author ON books(author);
 CREATE INDEX IF NOT EXISTS idx_books_genre ON books(genre_id);
 CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id);
 CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
+CREATE INDEX IF NOT EXISTS idx_books_price_id ON books(price, id);
+CREATE INDEX IF NOT EXISTS idx_books_year_id ON books(year DESC, id DESC);
+-- Нормализованные поля заполняет приложение при первом запуске
+CREATE INDEX IF NOT EXISTS idx_books_title_norm ON books(title_norm);
+CREATE INDEX IF NOT EXISTS idx_books_author_norm ON books(author_norm);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_books_unique_title_author ON books(title_norm, author_norm);
+
+-- Поля и журнал импорта из Excel (см. excel_import.py)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_books_article ON books(article);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_external_number ON orders(external_number);
+CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id);
+CREATE TABLE IF NOT EXISTS excel_imports (
+    source VARCHAR(50) PRIMARY KEY,
+    rows_imported INTEGER NOT NULL,
+    imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS excel_row_hashes (
+    source VARCHAR(50) NOT NULL,
+    row_key VARCHAR(50) NOT NULL,
+    row_hash CHAR(40) NOT NULL,
+    PRIMARY KEY (source, row_key)
+) WITHOUT ROWID;
+
+-- Правки заказов из интерфейса
+CREATE TABLE IF NOT EXISTS order_overrides (
+    order_id INTEGER PRIMARY KEY,
+    status VARCHAR(20),
+    delivery_date VARCHAR(20),
+    pickup_code VARCHAR(20),
+    client_name VARCHAR(100),
+    composition TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Правки заказов из Excel, которых нет в orders (по номеру заказа в файле)
+CREATE TABLE IF NOT EXISTS excel_order_overrides (
+    external_number INTEGER PRIMARY KEY,
+    status VARCHAR(20),
+    delivery_date VARCHAR(20),
+    pickup_code VARCHAR(20),
+    client_name VARCHAR(100),
+    composition TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Полнотекстовый индекс для поиска книг
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+    title_norm, author_norm, description,
+    content='books', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+    INSERT INTO books_fts (rowid, title_norm, author_norm, description)
+    VALUES (new.id, new.title_norm, new.author_norm, new.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+    INSERT INTO books_fts (books_fts, rowid, title_norm, author_norm, description)
+    VALUES ('delete', old.id, old.title_norm, old.author_norm, old.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title_norm, author_norm, description ON books BEGIN
+    INSERT INTO books_fts (books_fts, rowid, title_norm, author_norm, description)
+    VALUES ('delete', old.id, old.title_norm, old.author_norm, old.description);
+    INSERT INTO books_fts (rowid, title_norm, author_norm, description)
+    VALUES (new.id, new.title_norm, new.author_norm, new.description);
+END;
 
 -- Вставка данных
 
@@ -145,3 +218,114 @@ INSERT OR IGNORE INTO books (title, author, genre_id, publisher_id, year, price,
 INSERT OR IGNORE INTO books (title, author, genre_id, publisher_id, year, price, stock_quantity, is_on_sale, discount_price, cover_image, description) VALUES ('Игра Эндера', 'Орсон Скотт Кард', 12, 1, 2021, 540, 0, 0, NULL, 'placeholder.png', 'История одаренного мальчика, готовящегося к защите Земли от инопланетной угрозы');
 INSERT OR IGNORE INTO books (title, author, genre_id, publisher_id, year, price, stock_quantity, is_on_sale, discount_price, cover_image, description) VALUES ('Автостопом по галактике', 'Дуглас Адамс', 12, 6, 2020, 510, 13, 1, 460, 'placeholder.png', 'Юмористическая фантастика о невероятных приключениях землянина Артура Дента');
 INSERT OR IGNORE INTO books (title, author, genre_id, publisher_id, year, price, stock_quantity, is_on_sale, discount_price, cover_image, description) VALUES ('Цветы для Элджернона', 'Дэниел Киз', 13, 10, 2021, 470, 8, 1, 420, 'placeholder.png', 'Трогательная история человека, участвующего в эксперименте по повышению интеллекта');
+
+-- Журнал изменений и счетчики по таблицам: по ним другие копии приложения узнают об изменениях
+CREATE TABLE IF NOT EXISTS change_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name VARCHAR(30) NOT NULL,
+    row_id INTEGER,
+    action VARCHAR(10) NOT NULL,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS change_counters (
+    table_name VARCHAR(30) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO change_counters (table_name, version) VALUES ('books', 0);
+INSERT OR IGNORE INTO change_counters (table_name, version) VALUES ('users', 0);
+INSERT OR IGNORE INTO change_counters (table_name, version) VALUES ('orders', 0);
+INSERT OR IGNORE INTO change_counters (table_name, version) VALUES ('order_items', 0);
+INSERT OR IGNORE INTO change_counters (table_name, version) VALUES ('order_overrides', 0);
+INSERT OR IGNORE INTO change_counters (table_name, version) VALUES ('excel_order_overrides', 0);
+
+CREATE TRIGGER IF NOT EXISTS books_log_insert AFTER INSERT ON books BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('books', new.id, 'insert');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'books';
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_log_update AFTER UPDATE ON books BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('books', new.id, 'update');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'books';
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_log_delete AFTER DELETE ON books BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('books', old.id, 'delete');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'books';
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_log_insert AFTER INSERT ON users BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('users', new.id, 'insert');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'users';
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_log_update AFTER UPDATE ON users BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('users', new.id, 'update');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'users';
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_log_delete AFTER DELETE ON users BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('users', old.id, 'delete');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'users';
+END;
+
+CREATE TRIGGER IF NOT EXISTS orders_log_insert AFTER INSERT ON orders BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('orders', new.id, 'insert');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'orders';
+END;
+
+CREATE TRIGGER IF NOT EXISTS orders_log_update AFTER UPDATE ON orders BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('orders', new.id, 'update');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'orders';
+END;
+
+CREATE TRIGGER IF NOT EXISTS orders_log_delete AFTER DELETE ON orders BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('orders', old.id, 'delete');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'orders';
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_items_log_insert AFTER INSERT ON order_items BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('order_items', new.order_id, 'insert');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'order_items';
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_items_log_update AFTER UPDATE ON order_items BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('order_items', new.order_id, 'update');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'order_items';
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_items_log_delete AFTER DELETE ON order_items BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('order_items', old.order_id, 'delete');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'order_items';
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_overrides_log_insert AFTER INSERT ON order_overrides BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('order_overrides', new.order_id, 'insert');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'order_overrides';
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_overrides_log_update AFTER UPDATE ON order_overrides BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('order_overrides', new.order_id, 'update');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'order_overrides';
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_overrides_log_delete AFTER DELETE ON order_overrides BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('order_overrides', old.order_id, 'delete');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'order_overrides';
+END;
+
+CREATE TRIGGER IF NOT EXISTS excel_order_overrides_log_insert AFTER INSERT ON excel_order_overrides BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('excel_order_overrides', new.external_number, 'insert');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'excel_order_overrides';
+END;
+
+CREATE TRIGGER IF NOT EXISTS excel_order_overrides_log_update AFTER UPDATE ON excel_order_overrides BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('excel_order_overrides', new.external_number, 'update');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'excel_order_overrides';
+END;
+
+CREATE TRIGGER IF NOT EXISTS excel_order_overrides_log_delete AFTER DELETE ON excel_order_overrides BEGIN
+    INSERT INTO change_log (table_name, row_id, action) VALUES ('excel_order_overrides', old.external_number, 'delete');
+    UPDATE change_counters SET version = version + 1 WHERE table_name = 'excel_order_overrides';
+END;
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Импорт данных из Excel файлов в базу данных "Книжный Мир"
+Запуск: python excel_import.py [папка с файлами] [путь к базе] [--full] [--workers N]
+"""
+
+import os
+import glob
+import sqlite3
+import hashlib
+import argparse
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from create_db import normalize_text, create_import_tables
+from excel_reader import iter_records, read_sheet, records_from_sheet, worksheet_paths
+from storage import StorageSettings, configure_connection
+
+DATA_DIR = "Модуль 1/Прил_2_ОЗ_КОД 09.02.07-2-2026-М1"
+
+ROLE_MAPPING = {
+    'Администратор': 'admin',
+    'Менеджер': 'manager',
+    'Авторизованный клиент': 'client',
+    'Клиент': 'client',
+    'Гость': 'guest'
+}
+
+STATUS_MAPPING = {
+    'Новый': 'pending',
+    'В обработке': 'processing',
+    'Готов к выдаче': 'ready',
+    'Доставлен': 'completed',
+    'Завершен': 'completed',
+    'Отменен': 'cancelled'
+}
+
+def to_text(value):
+    return '' if value is None else str(value)
+
+def to_int(value, default=0):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+def to_float(value, default=None):
+    try:
+        return float(str(value).replace(',', '.'))
+    except (TypeError, ValueError):
+        return default
+
+def excel_date(value):
+    """Переводит дату Excel в строку ГГГГ-ММ-ДД для базы"""
+    # Ячейки с форматом даты уже разобраны в date
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d')
+    serial = to_float(value)
+    if serial is None:
+        return value or None
+    # Excel считает дни с 1 января 1900 года с ошибочным 29 февраля
+    return (datetime(1899, 12, 30) + timedelta(days=int(serial))).strftime('%Y-%m-%d')
+
+def parse_composition(text):
+    """Разбирает состав заказа 'Артикул, Кол-во, Артикул, Кол-во' в список пар"""
+    parts = [part.strip() for part in str(text or '').split(',') if part.strip()]
+    return [(parts[i], to_int(parts[i + 1], 1)) for i in range(0, len(parts) - 1, 2)]
+
+def row_hash(record):
+    """Хеш содержимого строки для определения изменений при повторном импорте"""
+    text = '\x1f'.join(f'{key}\x1e{value}' for key, value in sorted(record.items()))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def batched(rows, size):
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def print_progress(source, done):
+    print(f"  {source}: {done} строк")
+
+class ExcelImporter:
+    """Загрузка пунктов выдачи, пользователей, книг и заказов из Excel в SQLite.
+
+    Строки пишутся пакетами через executemany, каждый файл - одна транзакция.
+    Уже существующие записи обновляются: ключи - номер пункта, логин,
+    артикул книги и номер заказа.
+
+    Заказы импортируются по разнице: хеши строк хранятся в excel_row_hashes,
+    поэтому повторный импорт записывает только новые и измененные заказы
+    и удаляет исчезнувшие из файла. full=True перезаписывает все строки.
+
+    Читаются все листы всех файлов источника (orders.xlsx, orders_2025.xlsx...).
+    При workers > 1 листы разбираются параллельно в пуле процессов, а в базу
+    пишет только основной процесс. В работе одновременно не больше workers
+    листов, чтобы разобранные листы не накапливались в памяти.
+    """
+
+    # Порядок важен: заказы ссылаются на пункты выдачи, пользователей и книги
+    FILES = (
+        ('pickup_points', 'pickup_points.xlsx'),
+        ('users', 'users.xlsx'),
+        ('books', 'books.xlsx'),
+        ('orders', 'orders.xlsx'),
+    )
+
+    def __init__(self, db_path='bookstore.db', data_dir=DATA_DIR, batch_size=5000,
+                 progress=print_progress, full=False, workers=1):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self.batch_size = batch_size
+        self.progress = progress
+        self.full = full
+        self.workers = workers
+        self.skipped = {}
+        self.unchanged = {}
+        self.deleted = {}
+
+    def find_sheets(self, filename):
+        """Возвращает листы всех файлов источника: orders.xlsx, orders_*.xlsx"""
+        stem, ext = os.path.splitext(filename)
+        paths = [os.path.join(self.data_dir, filename)]
+        paths += sorted(glob.glob(os.path.join(glob.escape(self.data_dir), f'{stem}_*{ext}')))
+        return [(path, sheet) for path in paths if os.path.exists(path)
+                for sheet in worksheet_paths(path)]
+
+    def run(self, sources=None):
+        """Импортирует файлы и возвращает количество записанных строк по каждому"""
+        sheets = {source: self.find_sheets(filename) for source, filename in self.FILES
+                  if sources is None or source in sources}
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA foreign_keys = ON')
+        configure_connection(conn, StorageSettings.load())
+        results = {}
+        try:
+            create_import_tables(conn.cursor())
+            conn.commit()
+
+            for source, filename in self.FILES:
+                if source not in sheets:
+                    continue
+                if not sheets[source]:
+                    print(f"Файл {os.path.join(self.data_dir, filename)} не найден")
+                    continue
+
+                if executor is not None:
+                    records = self.parse_sheets(executor, sheets[source])
+                else:
+                    records = itertools.chain.from_iterable(
+                        iter_records(path, sheet) for path, sheet in sheets[source])
+
+                with conn:
+                    cursor = conn.cursor()
+                    results[source] = getattr(self, f'import_{source}')(cursor, records)
+                    cursor.execute('''
+                        INSERT INTO excel_imports (source, rows_imported) VALUES (?, ?)
+                        ON CONFLICT(source) DO UPDATE SET rows_imported = excluded.rows_imported,
+                                                          imported_at = CURRENT_TIMESTAMP
+                    ''', (source, results[source]))
+        finally:
+            conn.close()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        for source, count in self.skipped.items():
+            print(f"Пропущено строк ({source}): {count}")
+        for source, count in self.unchanged.items():
+            print(f"Без изменений ({source}): {count}")
+        for source, count in self.deleted.items():
+            print(f"Удалено ({source}): {count}")
+        return results
+
+    def parse_sheets(self, executor, items):
+        """Разбирает листы в пуле процессов и отдает записи по порядку листов.
+
+        Следующий лист отправляется в пул, только когда основной процесс
+        забрал разобранный: в работе и в ожидании не больше workers листов.
+        """
+        items = iter(items)
+        pending = deque(executor.submit(read_sheet, path, sheet)
+                        for path, sheet in itertools.islice(items, self.workers))
+        while pending:
+            headers, rows = pending.popleft().result()
+            for path, sheet in itertools.islice(items, 1):
+                pending.append(executor.submit(read_sheet, path, sheet))
+            yield from records_from_sheet(headers, rows)
+
+    def write_rows(self, cursor, source, sql, rows):
+        """Пишет строки пакетом, строки с ошибками ограничений пропускает"""
+        try:
+            cursor.executemany(sql, rows)
+            return len(rows)
+        except sqlite3.IntegrityError:
+            pass
+
+        # В пакете есть конфликтующая строка - повторяем построчно
+        written = 0
+        for row in rows:
+            try:
+                cursor.execute(sql, row)
+                written += 1
+            except sqlite3.IntegrityError as e:
+                print(f"Строка не импортирована ({source}): {e}")
+                self.skip(source)
+        return written
+
+    def skip(self, source, count=1):
+        self.skipped[source] = self.skipped.get(source, 0) + count
+
+    def import_batches(self, cursor, source, records, write_batch):
+        """Пишет записи пакетами по batch_size и сообщает о прогрессе.
+
+        Возвращает количество записанных строк.
+        """
+        done = written = 0
+        for batch in batched(records, self.batch_size):
+            written += write_batch(cursor, batch)
+            done += len(batch)
+            if self.progress:
+                self.progress(source, done)
+        return written
+
+    def changed_rows(self, cursor, source, keyed_records):
+        """Отбирает строки, хеш которых отличается от сохраненного при прошлом импорте"""
+        hashes = {key: row_hash(record) for key, record in keyed_records}
+        cursor.executemany('INSERT OR IGNORE INTO seen_keys (row_key) VALUES (?)',
+                           [(key,) for key in hashes])
+        if self.full or not hashes:
+            return keyed_records, hashes
+
+        # Ключи пакета кладем во временную таблицу: список IN (?, ?, ...) на весь пакет
+        # превысил бы ограничение SQLite на число параметров в старых версиях
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS batch_keys (row_key TEXT PRIMARY KEY)')
+        cursor.execute('DELETE FROM batch_keys')
+        cursor.executemany('INSERT OR IGNORE INTO batch_keys (row_key) VALUES (?)', [(key,) for key in hashes])
+        cursor.execute('''
+            SELECT h.row_key, h.row_hash FROM excel_row_hashes h
+            JOIN batch_keys k ON k.row_key = h.row_key
+            WHERE h.source = ?
+        ''', (source,))
+        stored = dict(cursor.fetchall())
+
+        changed = [(key, record) for key, record in keyed_records if stored.get(key) != hashes[key]]
+        if len(changed) < len(keyed_records):
+            self.unchanged[source] = self.unchanged.get(source, 0) + len(keyed_records) - len(changed)
+        return changed, hashes
+
+    def import_pickup_points(self, cursor, records):
+        def write_batch(cursor, batch):
+            rows = [(point_id, f'Пункт выдачи {point_id}', record.get('Адрес пункта выдачи'))
+                    for point_id, record in batch]
+            return self.write_rows(cursor, 'pickup_points', '''
+                INSERT INTO pickup_points (id, name, address) VALUES (?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET address = excluded.address
+            ''', rows)
+
+        # Номер пункта выдачи в заказах - номер строки в файле
+        return self.import_batches(cursor, 'pickup_points', enumerate(records, 1), write_batch)
+
+    def import_users(self, cursor, records):
+        def write_batch(cursor, batch):
+            rows = []
+            for record in batch:
+                role = ROLE_MAPPING.get(record.get('Роль', ''))
+                if not role or not record.get('Логин'):
+                    self.skip('users')
+                    continue
+                rows.append((to_text(record['Логин']), to_text(record.get('Пароль')),
+                             to_text(record.get('ФИО')), role))
+            return self.write_rows(cursor, 'users', '''
+                INSERT INTO users (login, password, full_name, role) VALUES (?, ?, ?, ?)
+                ON CONFLICT(login) DO UPDATE SET password = excluded.password,
+                                                 full_name = excluded.full_name,
+                                                 role = excluded.role
+            ''', rows)
+
+        return self.import_batches(cursor, 'users', records, write_batch)
+
+    def lookup_ids(self, cursor, table, names, known):
+        """Возвращает id справочника по названиям, добавляя отсутствующие"""
+        missing = [(name,) for name in set(names) if name not in known]
+        if missing:
+            cursor.executemany(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', missing)
+            cursor.execute(f'SELECT name, id FROM {table}')
+            known.update(cursor.fetchall())
+        return known
+
+    def import_books(self, cursor, records):
+        genres, publishers = {}, {}
+
+        def write_batch(cursor, batch):
+            batch = [record for record in batch if record.get('Артикул') is not None]
+            self.lookup_ids(cursor, 'genres', [to_text(r.get('Жанр')) for r in batch], genres)
+            self.lookup_ids(cursor, 'publishers', [to_text(r.get('Издательство')) for r in batch], publishers)
+
+            rows = []
+            for record in batch:
+                title = to_text(record.get('Наименование товара'))
+                author = to_text(record.get('Автор'))
+                rows.append((
+                    to_text(record['Артикул']), title, author,
+                    genres[to_text(record.get('Жанр'))], publishers[to_text(record.get('Издательство'))],
+                    to_int(record.get('Год')), to_float(record.get('Цена'), 0.0),
+                    to_int(record.get('Кол-во на складе')),
+                    record.get('В акции') in ('Да', True), to_float(record.get('Акционная цена')),
+                    to_text(record.get('Обложка')) or None, to_text(record.get('Описание товара')),
+                    normalize_text(title), normalize_text(author)
+                ))
+
+            # Книги, заведенные вручную, получают артикул и дальше обновляются по нему
+            cursor.executemany('''
+                UPDATE books SET article = ?
+                WHERE article IS NULL AND title_norm = ? AND author_norm = ?
+            ''', [(row[0], row[12], row[13]) for row in rows])
+
+            return self.write_rows(cursor, 'books', '''
+                INSERT INTO books (article, title, author, genre_id, publisher_id, year, price,
+                                   stock_quantity, is_on_sale, discount_price, cover_image, description,
+                                   title_norm, author_norm)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(article) DO UPDATE SET
+                    title = excluded.title, author = excluded.author,
+                    genre_id = excluded.genre_id, publisher_id = excluded.publisher_id,
+                    year = excluded.year, price = excluded.price,
+                    stock_quantity = excluded.stock_quantity, is_on_sale = excluded.is_on_sale,
+                    discount_price = excluded.discount_price, cover_image = excluded.cover_image,
+                    description = excluded.description,
+                    title_norm = excluded.title_norm, author_norm = excluded.author_norm
+            ''', rows)
+
+        return self.import_batches(cursor, 'books', records, write_batch)
+
+    def import_orders(self, cursor, records):
+        # Номера заказов из файла - чтобы затем удалить заказы, которых в нем больше нет
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS seen_keys (row_key TEXT PRIMARY KEY)')
+        cursor.execute('DELETE FROM seen_keys')
+
+        cursor.execute('SELECT full_name, MIN(id) FROM users GROUP BY full_name')
+        users = dict(cursor.fetchall())
+        cursor.execute('''
+            SELECT article, id, CASE WHEN is_on_sale AND discount_price THEN discount_price ELSE price END
+            FROM books WHERE article IS NOT NULL
+        ''')
+        books = {article: (book_id, price) for article, book_id, price in cursor.fetchall()}
+
+        def write_batch(cursor, batch):
+            keyed_records = []
+            for record in batch:
+                number = to_int(record.get('Номер заказа'), None)
+                if number is None:
+                    self.skip('orders')
+                    continue
+                keyed_records.append((str(number), record))
+            changed, hashes = self.changed_rows(cursor, 'orders', keyed_records)
+
+            orders, items = [], []
+            for key, record in changed:
+                number = int(key)
+                user_id = users.get(record.get('ФИО клиента'))
+                if user_id is None:
+                    self.skip('orders')
+                    continue
+
+                total = 0.0
+                for article, quantity in parse_composition(to_text(record.get('Состав заказа (Артикул, Кол-во)'))):
+                    if article not in books:
+                        self.skip('order_items')
+                        continue
+                    book_id, price = books[article]
+                    items.append((book_id, quantity, price, number))
+                    total += price * quantity
+
+                orders.append((
+                    number, user_id, to_int(record.get('ID Пункта выдачи')),
+                    STATUS_MAPPING.get(record.get('Статус заказа'), 'pending'), total,
+                    excel_date(record.get('Дата заказа')), excel_date(record.get('Дата доставки')),
+                    to_text(record.get('Код для получения'))
+                ))
+
+            # Номер заказа из файла хранится в external_number, id заказа выдает база
+            written = self.write_rows(cursor, 'orders', '''
+                INSERT INTO orders (external_number, user_id, pickup_point_id, status, total_amount,
+                                    order_date, completion_date, pickup_code)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(external_number) DO UPDATE SET
+                    user_id = excluded.user_id, pickup_point_id = excluded.pickup_point_id,
+                    status = excluded.status, total_amount = excluded.total_amount,
+                    order_date = excluded.order_date, completion_date = excluded.completion_date,
+                    pickup_code = excluded.pickup_code
+            ''', orders)
+
+            # Состав заказа заменяется целиком
+            cursor.executemany('''
+                DELETE FROM order_items WHERE order_id = (SELECT id FROM orders WHERE external_number = ?)
+            ''', [(row[0],) for row in orders])
+            self.write_rows(cursor, 'order_items', '''
+                INSERT INTO order_items (order_id, book_id, quantity, price)
+                SELECT id, ?, ?, ? FROM orders WHERE external_number = ?
+            ''', items)
+
+            # Хеш запоминаем только для записанных заказов, остальные повторятся в следующий раз
+            cursor.executemany('''
+                INSERT INTO excel_row_hashes (source, row_key, row_hash)
+                SELECT 'orders', ?, ? WHERE EXISTS (SELECT 1 FROM orders WHERE external_number = ?)
+                ON CONFLICT(source, row_key) DO UPDATE SET row_hash = excluded.row_hash
+            ''', [(str(row[0]), hashes[str(row[0])], row[0]) for row in orders])
+            return written
+
+        written = self.import_batches(cursor, 'orders', records, write_batch)
+
+        # Заказы, загруженные раньше и исчезнувшие из файла
+        removed = '''
+            SELECT CAST(row_key AS INTEGER) FROM excel_row_hashes
+            WHERE source = 'orders' AND row_key NOT IN (SELECT row_key FROM seen_keys)
+        '''
+        cursor.execute(f'''
+            DELETE FROM order_items
+            WHERE order_id IN (SELECT id FROM orders WHERE external_number IN ({removed}))
+        ''')
+        cursor.execute(f'DELETE FROM orders WHERE external_number IN ({removed})')
+        if cursor.rowcount > 0:
+            self.deleted['orders'] = cursor.rowcount
+        cursor.execute('''
+            DELETE FROM excel_row_hashes
+            WHERE source = 'orders' AND row_key NOT IN (SELECT row_key FROM seen_keys)
+        ''')
+        return written
+
+def main():
+    parser = argparse.ArgumentParser(description='Импорт данных из Excel в базу "Книжный Мир"')
+    parser.add_argument('data_dir', nargs='?', default=DATA_DIR, help='папка с файлами Excel')
+    parser.add_argument('db_path', nargs='?', default='bookstore.db', help='путь к базе данных')
+    parser.add_argument('--full', action='store_true',
+                        help='перезаписать все заказы, не сравнивая с прошлым импортом')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='количество процессов для разбора листов')
+    args = parser.parse_args()
+
+    print(f"Импорт данных из {args.data_dir} в {args.db_path}...")
+    results = ExcelImporter(args.db_path, args.data_dir, full=args.full, workers=args.workers).run()
+    for source, count in results.items():
+        print(f"{source}: импортировано {count}")
+
+if __name__ == "__main__":
+    main()
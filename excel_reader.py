@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Потоковое чтение Excel файлов (.xlsx) без сторонних библиотек
+Строки листа разбираются по одной, поэтому память не растет с размером файла.
+Значения ячеек возвращаются типизированными: str, int, float, bool, date, datetime
+"""
+
+import os
+import re
+import json
+import hashlib
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+
+NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+# Встроенные форматы чисел Excel, которые означают дату или время
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+
+def string_text(elem):
+    """Текст строки Excel (si или is): элемент t или фрагменты r/t.
+
+    Фонетические подсказки rPh тоже содержат t, но в текст ячейки не входят.
+    """
+    parts = []
+    for child in elem:
+        if child.tag == NS + 't':
+            parts.append(child.text or '')
+        elif child.tag == NS + 'r':
+            # Строка может состоять из нескольких фрагментов с разным форматированием
+            parts.extend(t.text or '' for t in child.findall(NS + 't'))
+    return ''.join(parts)
+
+def read_shared_strings(zip_file):
+    """Читает таблицу общих строк книги"""
+    shared_strings = []
+    try:
+        f = zip_file.open('xl/sharedStrings.xml')
+    except KeyError:
+        return shared_strings
+
+    with f:
+        for event, elem in ET.iterparse(f, events=('end',)):
+            if elem.tag == NS + 'si':
+                shared_strings.append(string_text(elem))
+                elem.clear()
+    return shared_strings
+
+def is_date_format(format_code):
+    """Проверяет, что пользовательский формат числа выводит дату или время"""
+    # Убираем текст в кавычках, цвета и условия в скобках, экранированные символы
+    code = re.sub(r'"[^"]*"|\[[^\]]*\]|\\.', '', format_code).lower()
+    return any(ch in code for ch in 'dmyhs')
+
+def read_date_styles(zip_file):
+    """Возвращает номера стилей ячеек (атрибут s), которые форматируют число как дату"""
+    try:
+        f = zip_file.open('xl/styles.xml')
+    except KeyError:
+        return set()
+
+    custom_dates = set()
+    date_styles = set()
+    with f:
+        root = ET.parse(f).getroot()
+    for num_fmt in root.iter(NS + 'numFmt'):
+        if is_date_format(num_fmt.get('formatCode', '')):
+            custom_dates.add(int(num_fmt.get('numFmtId')))
+    cell_xfs = root.find(NS + 'cellXfs')
+    if cell_xfs is not None:
+        for index, xf in enumerate(cell_xfs.findall(NS + 'xf')):
+            num_fmt_id = int(xf.get('numFmtId', 0))
+            if num_fmt_id in BUILTIN_DATE_FORMATS or num_fmt_id in custom_dates:
+                date_styles.add(index)
+    return date_styles
+
+def uses_1904_dates(zip_file):
+    """Проверяет, что даты книги отсчитываются от 1904 года (книги из Excel для Mac)"""
+    try:
+        with zip_file.open('xl/workbook.xml') as f:
+            for event, elem in ET.iterparse(f, events=('end',)):
+                if elem.tag == NS + 'workbookPr':
+                    return elem.get('date1904') in ('1', 'true')
+    except KeyError:
+        pass
+    return False
+
+def column_index(cell_ref):
+    """Номер столбца (с нуля) по адресу ячейки, например 'H3' -> 7"""
+    index = 0
+    for ch in cell_ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + ord(ch.upper()) - ord('A') + 1
+    return index - 1
+
+class CellDecoder:
+    """Преобразует ячейку листа в значение Python с учетом типа и формата"""
+
+    def __init__(self, shared_strings, date_styles, date1904=False):
+        self.shared_strings = shared_strings
+        self.date_styles = date_styles
+        self.epoch = datetime(1904, 1, 1) if date1904 else datetime(1899, 12, 30)
+
+    @classmethod
+    def from_zip(cls, zip_file):
+        return cls(read_shared_strings(zip_file), read_date_styles(zip_file), uses_1904_dates(zip_file))
+
+    def to_date(self, serial):
+        value = self.epoch + timedelta(days=serial)
+        # Дата без времени возвращается как date
+        return value.date() if serial == int(serial) else value
+
+    def decode(self, cell):
+        cell_type = cell.get('t', 'n')
+        if cell_type == 'inlineStr':
+            inline = cell.find(NS + 'is')
+            return string_text(inline) if inline is not None else ''
+
+        value_elem = cell.find(NS + 'v')
+        if value_elem is None or value_elem.text is None:
+            return None
+        text = value_elem.text
+
+        if cell_type == 's':
+            index = int(text)
+            return self.shared_strings[index] if index < len(self.shared_strings) else ''
+        if cell_type in ('str', 'inlineStr'):
+            return text
+        if cell_type == 'b':
+            return text == '1'
+        if cell_type == 'e':
+            return None
+        if cell_type == 'd':
+            # Дата в формате ISO 8601
+            return datetime.fromisoformat(text)
+
+        number = float(text)
+        if cell.get('s') is not None and int(cell.get('s')) in self.date_styles:
+            return self.to_date(number)
+        return int(number) if number.is_integer() and 'E' not in text.upper() else number
+
+def find_worksheet(zip_file):
+    """Возвращает путь к первому листу книги"""
+    worksheet_path = 'xl/worksheets/sheet1.xml'
+    names = zip_file.namelist()
+    if worksheet_path not in names:
+        # Ищем первый worksheet
+        for name in names:
+            if name.startswith('xl/worksheets/sheet') and name.endswith('.xml'):
+                return name
+    return worksheet_path
+
+def list_worksheets(zip_file):
+    """Возвращает пути всех листов книги по порядку номеров"""
+    names = [name for name in zip_file.namelist()
+             if name.startswith('xl/worksheets/sheet') and name.endswith('.xml')]
+    return sorted(names, key=lambda name: int(re.sub(r'\D', '', name.rsplit('/', 1)[1]) or 0))
+
+def worksheet_paths(file_path):
+    """Возвращает пути всех листов файла"""
+    with zipfile.ZipFile(file_path, 'r') as zip_file:
+        return list_worksheets(zip_file)
+
+def iter_sheet_rows(zip_file, worksheet_path, decoder):
+    """Генератор строк листа в виде списков значений ячеек.
+
+    Excel не сохраняет пустые ячейки, поэтому значение ставится в столбец
+    по адресу ячейки (атрибут r), пропуски заполняются None.
+    """
+    with zip_file.open(worksheet_path) as f:
+        sheet_data = None
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == NS + 'sheetData':
+                    sheet_data = elem
+                continue
+            if elem.tag != NS + 'row':
+                continue
+
+            row_data = []
+            for cell in elem.iter(NS + 'c'):
+                cell_ref = cell.get('r')
+                column = column_index(cell_ref) if cell_ref else len(row_data)
+                if column >= len(row_data):
+                    row_data.extend([None] * (column + 1 - len(row_data)))
+                row_data[column] = decoder.decode(cell)
+            yield row_data
+
+            # Освобождаем разобранную строку, чтобы дерево не росло
+            elem.clear()
+            if sheet_data is not None:
+                sheet_data.clear()
+
+def iter_rows(file_path, worksheet_path=None):
+    """Генератор строк листа книги (по умолчанию первого)"""
+    with zipfile.ZipFile(file_path, 'r') as zip_file:
+        decoder = CellDecoder.from_zip(zip_file)
+        yield from iter_sheet_rows(zip_file, worksheet_path or find_worksheet(zip_file), decoder)
+
+def iter_records(file_path, worksheet_path=None):
+    """Генератор строк листа в виде словарей по заголовкам.
+
+    Пустые ячейки строки дают None, полностью пустые строки пропускаются.
+    """
+    headers = None
+    for row_data in iter_rows(file_path, worksheet_path):
+        if all(value is None for value in row_data):
+            continue
+        if headers is None:
+            # Первая строка - заголовки
+            headers = [None if header is None else str(header) for header in row_data]
+            continue
+        if len(row_data) < len(headers):
+            row_data = row_data + [None] * (len(headers) - len(row_data))
+        yield {header: value for header, value in zip(headers, row_data) if header is not None}
+
+def read_sheet(file_path, worksheet_path=None):
+    """Читает лист целиком и возвращает (заголовки, строки).
+
+    Компактнее списка словарей, поэтому подходит для передачи из пула процессов.
+    """
+    headers, rows = [], []
+    for record in iter_records(file_path, worksheet_path):
+        if not headers:
+            headers = list(record)
+        rows.append(list(record.values()))
+    return headers, rows
+
+def records_from_sheet(headers, rows):
+    """Генератор словарей из результата read_sheet"""
+    for row_data in rows:
+        yield dict(zip(headers, row_data))
+
+class WorkbookCache:
+    """Кэш разобранных данных из Excel, привязанный к отпечатку файла.
+
+    Отпечаток — путь, размер и время изменения файла, при use_hash=True
+    дополнительно хеш содержимого. Кэш сохраняется на диск, поэтому после
+    перезапуска неизмененный файл не перечитывается.
+    """
+
+    # Меняется вместе с форматом сохраняемых данных, старый кэш при этом сбрасывается
+    VERSION = 2
+
+    def __init__(self, cache_path, use_hash=False):
+        self.cache_path = cache_path
+        self.use_hash = use_hash
+        self._lock = threading.Lock()
+        self.entries = self.load()
+        self.metrics = {'hits': 0, 'misses': 0}
+
+    def load(self):
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'version': self.VERSION, 'entries': self.entries}, ensure_ascii=False)
+        tmp_path = f"{self.cache_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Не удалось сохранить кэш Excel: {e}")
+
+    @staticmethod
+    def file_hash(path):
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def is_fresh(self, entry, path, stat):
+        """Проверяет, что файл не изменился с момента разбора"""
+        if entry['size'] != stat.st_size:
+            return False
+        if entry['mtime'] == stat.st_mtime_ns:
+            return True
+        # Время изменения другое (файл скопировали или сохранили заново) — сверяем содержимое
+        if self.use_hash and entry.get('hash') == self.file_hash(path):
+            with self._lock:
+                entry['mtime'] = stat.st_mtime_ns
+            self.save()
+            return True
+        return False
+
+    def get(self, file_path, loader):
+        """Возвращает данные файла из кэша или разбирает его через loader(file_path)"""
+        path = os.path.abspath(file_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return loader(file_path)
+
+        with self._lock:
+            entry = self.entries.get(path)
+        if entry is not None and self.is_fresh(entry, path, stat):
+            self.metrics['hits'] += 1
+            return entry['data']
+
+        self.metrics['misses'] += 1
+        data = loader(file_path)
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'data': data}
+        if self.use_hash:
+            entry['hash'] = self.file_hash(path)
+        with self._lock:
+            self.entries[path] = entry
+        self.save()
+        return data
+
+    def invalidate(self, file_path=None):
+        """Сбрасывает кэш одного файла или всех файлов"""
+        with self._lock:
+            if file_path is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(os.path.abspath(file_path), None)
+        self.save()
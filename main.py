@@ -7,43 +7,597 @@
 
 import sys
 import os
-import zipfile
-import xml.etree.ElementTree as ET
+import itertools
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QPushButton, QLineEdit, 
-                             QMessageBox, QStackedWidget, QFrame, QScrollArea,
-                             QGridLayout, QComboBox, QCheckBox, QSpinBox,
-                             QTableWidget, QTableWidgetItem, QTabWidget,
+                             QMessageBox, QStackedWidget, QFrame,
+                             QComboBox, QCheckBox, QSpinBox,
+                             QTabWidget,
                              QDialog, QDialogButtonBox, QFormLayout,
-                             QTextEdit, QDateEdit, QGroupBox, QSplitter)
-from PyQt5.QtCore import Qt, QSize, QDate
-from PyQt5.QtGui import QPixmap, QFont, QIcon, QPalette, QColor
+                             QTextEdit, QDateEdit, QGroupBox, QSplitter,
+                             QListView, QAbstractItemView, QStyledItemDelegate, QStyle,
+                             QTableView, QHeaderView)
+from PyQt5.QtCore import (Qt, QSize, QDate, QRect, QPoint, QTimer, QAbstractListModel, QModelIndex,
+                          QAbstractTableModel, QSortFilterProxyModel, QEvent,
+                          QObject, QRunnable, QThreadPool, pyqtSignal)
+from PyQt5.QtGui import QPixmap, QImage, QFont, QIcon, QPalette, QColor, QPainter, QPen, QFontMetrics
 import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 from datetime import datetime
+from create_db import normalize_text
+from thumbnails import ThumbnailStore, THUMBNAIL_SIZE
+from excel_reader import iter_records, WorkbookCache
+from storage import StorageSettings, Checkpointer, configure_connection, enable_journal_mode
+from queries import BOOK_SORT_COLUMNS, book_query_name, create_registry
+
+# Общее хранилище миниатюр обложек на диске
+thumbnail_store = ThumbnailStore()
+
+class ConnectionPool:
+    """Пул подключений к SQLite с повторным использованием соединений"""
+    
+    def __init__(self, db_path, size=5, timeout=30.0, health_check_interval=60.0, settings=None,
+                 cached_statements=128, on_open=None):
+        self.db_path = db_path
+        self.settings = settings or StorageSettings()
+        self.on_open = on_open  # Дополнительная настройка каждого нового соединения
+        self.size = size
+        self.timeout = timeout
+        self.cached_statements = cached_statements  # Размер кэша подготовленных выражений соединения
+        self.health_check_interval = health_check_interval
+        
+        self._idle = []  # Свободные соединения: (conn, время возврата в пул)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()  # Соединение, выданное текущему потоку
+        
+        # Метрики пула
+        self.metrics = {
+            'opened': 0,
+            'reused': 0,
+            'closed': 0,
+            'health_failures': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+    
+    def _open(self):
+        """Открывает новое соединение с базой данных"""
+        # Соединение может использоваться из разных потоков, но всегда только одним за раз
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        configure_connection(conn, self.settings)
+        if self.on_open is not None:
+            self.on_open(conn)
+        with self._lock:
+            self.metrics['opened'] += 1
+        return conn
+    
+    def _close(self, conn):
+        """Закрывает соединение"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self.metrics['closed'] += 1
+    
+    def _is_healthy(self, conn):
+        """Проверяет, что соединение работоспособно"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            with self._lock:
+                self.metrics['health_failures'] += 1
+            return False
+    
+    def _acquire(self):
+        """Берет соединение из пула, при необходимости ожидая свободный слот"""
+        started = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            # Все соединения заняты - ждем освобождения
+            if not self._slots.acquire(timeout=self.timeout):
+                raise sqlite3.OperationalError('Нет свободных подключений к базе данных')
+            waited = time.perf_counter() - started
+            with self._lock:
+                self.metrics['waits'] += 1
+                self.metrics['wait_time_total'] += waited
+                self.metrics['wait_time_max'] = max(self.metrics['wait_time_max'], waited)
+        
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    conn, released_at = self._idle.pop()
+                
+                # Давно не использовавшееся соединение проверяем перед выдачей
+                if time.monotonic() - released_at < self.health_check_interval or self._is_healthy(conn):
+                    with self._lock:
+                        self.metrics['reused'] += 1
+                    return conn
+                self._close(conn)
+            
+            return self._open()
+        except Exception:
+            self._slots.release()
+            raise
+    
+    def _release(self, conn):
+        """Возвращает соединение в пул"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Соединение, которое не удалось откатить, в пул не возвращаем
+            self._close(conn)
+        else:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+    
+    @contextmanager
+    def connection(self):
+        """Выдает соединение текущему потоку.
+        
+        Вложенные вызовы в одном потоке получают то же соединение.
+        При выходе из внешнего блока транзакция фиксируется,
+        а при исключении откатывается.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.pending = []
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            pending = self._local.pending
+            self._local.conn = None
+            self._local.pending = None
+            self._release(conn)
+        
+        # Действия, отложенные до фиксации транзакции (см. after_commit)
+        for callback in pending:
+            callback()
+    
+    def after_commit(self, callback):
+        """Вызывает callback после фиксации транзакции текущего потока.
+        
+        Вне транзакции callback вызывается сразу, при откате - не вызывается.
+        """
+        pending = getattr(self._local, 'pending', None)
+        if getattr(self._local, 'conn', None) is None or pending is None:
+            callback()
+        else:
+            pending.append(callback)
+    
+    def check_health(self):
+        """Проверяет все свободные соединения и закрывает неработающие"""
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+        
+        healthy = []
+        for conn, released_at in idle:
+            if self._is_healthy(conn):
+                healthy.append((conn, released_at))
+            else:
+                self._close(conn)
+        
+        with self._lock:
+            self._idle.extend(healthy)
+        return len(healthy)
+    
+    def stats(self):
+        """Возвращает метрики пула"""
+        with self._lock:
+            stats = dict(self.metrics)
+            stats['idle'] = len(self._idle)
+        stats['size'] = self.size
+        stats['in_use'] = stats['opened'] - stats['closed'] - stats['idle']
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['waits'] if stats['waits'] else 0.0
+        return stats
+    
+    def close_all(self):
+        """Закрывает все свободные соединения"""
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+        for conn, _ in idle:
+            self._close(conn)
+
+class ChangeEvent(namedtuple('ChangeEvent', 'entity action ids')):
+    """Изменение данных: сущность, действие и id затронутых записей.
+    
+    ids=None означает, что изменилось много записей сразу (например, после импорта).
+    """
+    
+    BOOK = 'book'
+    ORDER = 'order'
+    USER = 'user'
+    
+    INSERTED = 'inserted'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+
+class ChangeBus(QObject):
+    """Рассылка изменений данных подписанным виджетам.
+    
+    События из фоновых потоков доставляются в поток, где создана шина.
+    Подписка на метод виджета снимается при удалении виджета.
+    """
+    
+    changed = pyqtSignal(object)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.subscribers = {}  # Сущность -> список обработчиков
+        self.changed.connect(self.dispatch)
+    
+    def subscribe(self, entity, callback):
+        self.subscribers.setdefault(entity, []).append(callback)
+        owner = getattr(callback, '__self__', None)
+        if isinstance(owner, QObject):
+            owner.destroyed.connect(lambda *args: self.unsubscribe(entity, callback))
+    
+    def unsubscribe(self, entity, callback):
+        callbacks = self.subscribers.get(entity, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+    
+    def publish(self, entity, action, ids=None):
+        self.changed.emit(ChangeEvent(entity, action, None if ids is None else tuple(ids)))
+    
+    def dispatch(self, event):
+        for callback in list(self.subscribers.get(event.entity, [])):
+            callback(event)
+
+class ChangeWatcher(QObject):
+    """Следит за изменениями базы, сделанными другими копиями приложения.
+    
+    PRAGMA data_version меняется, только когда другое соединение фиксирует
+    транзакцию, поэтому пока база не менялась, опрос не читает таблиц.
+    Затем по счетчикам change_counters определяются измененные таблицы,
+    а по журналу change_log - измененные записи. Они рассылаются через
+    шину изменений как обычные события.
+    
+    Записи журнала, которые сделало само приложение (см. skip), не рассылаются:
+    о своих изменениях DatabaseManager сообщает сразу после фиксации.
+    """
+    
+    # Таблица журнала -> сущность события
+    TABLE_ENTITIES = {
+        'books': ChangeEvent.BOOK,
+        'users': ChangeEvent.USER,
+        'orders': ChangeEvent.ORDER,
+        'order_items': ChangeEvent.ORDER,
+        'order_overrides': ChangeEvent.ORDER,
+        'excel_order_overrides': ChangeEvent.ORDER,
+    }
+    ACTIONS = {'insert': ChangeEvent.INSERTED, 'update': ChangeEvent.UPDATED, 'delete': ChangeEvent.DELETED}
+    
+    POLL_INTERVAL_MS = 1000
+    BUSY_TIMEOUT = 0.1  # Опрос идет в потоке интерфейса, поэтому блокировку долго не ждем
+    MAX_EVENT_ROWS = 500  # Если записей в журнале больше, виджеты перезагружают данные целиком
+    MAX_LOG_ROWS = 10000  # Сколько последних записей журнала хранить
+    
+    def __init__(self, db_path, bus, interval_ms=None, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.bus = bus
+        self.interval_ms = self.POLL_INTERVAL_MS if interval_ms is None else interval_ms
+        self.conn = None
+        self.data_version = None
+        self.last_id = 0
+        self.counters = {}
+        self.own_ids = set()  # id записей журнала, сделанных этим процессом
+        self._own_lock = threading.Lock()
+        self.metrics = {'polls': 0, 'wakeups': 0, 'events': 0, 'full_reloads': 0, 'own_skipped': 0}
+        
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+    
+    def start(self):
+        # data_version сравнивается в пределах одного соединения, поэтому оно свое
+        self.conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT)
+        self.data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        self.conn.execute('BEGIN')
+        try:
+            self.counters = self.read_counters()
+            self.last_id = self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM change_log').fetchone()[0]
+        finally:
+            self.conn.rollback()
+        self.timer.start(self.interval_ms)
+    
+    def stop(self):
+        self.timer.stop()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+    
+    def skip(self, log_ids):
+        """Отмечает записи журнала как собственные (вызывается из любого потока)"""
+        with self._own_lock:
+            self.own_ids.update(log_ids)
+    
+    def take_own(self, max_id):
+        """Забирает отмеченные собственные записи с id <= max_id"""
+        with self._own_lock:
+            own = {log_id for log_id in self.own_ids if log_id <= max_id}
+            self.own_ids -= own
+        return own
+    
+    def read_counters(self):
+        return dict(self.conn.execute('SELECT table_name, version FROM change_counters').fetchall())
+    
+    def poll(self):
+        """Проверяет базу и рассылает события об изменениях других копий приложения"""
+        if self.conn is None:
+            return
+        self.metrics['polls'] += 1
+        try:
+            data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self.data_version:
+                return
+            self.metrics['wakeups'] += 1
+            
+            # Счетчики и журнал читаем в одной транзакции, чтобы они описывали один снимок базы
+            self.conn.execute('BEGIN')
+            try:
+                counters = self.read_counters()
+                first_id, max_id = self.conn.execute('SELECT MIN(id), MAX(id) FROM change_log').fetchone()
+                rows = None
+                if max_id is not None and self.last_id < max_id <= self.last_id + self.MAX_EVENT_ROWS + len(self.own_ids):
+                    rows = self.conn.execute('''
+                        SELECT id, table_name, row_id, action FROM change_log
+                        WHERE id > ? AND id <= ? ORDER BY id
+                    ''', (self.last_id, max_id)).fetchall()
+            finally:
+                self.conn.rollback()
+            
+            changed_tables = [table for table, version in counters.items()
+                              if version != self.counters.get(table)]
+            self.counters = counters
+            self.data_version = data_version
+            if not changed_tables or max_id is None or max_id <= self.last_id:
+                return
+            
+            own = self.take_own(max_id)
+            foreign_count = max_id - self.last_id - len([log_id for log_id in own if log_id > self.last_id])
+            if foreign_count <= 0 and first_id <= self.last_id + 1:
+                # Все новые записи сделаны этим процессом
+                self.metrics['own_skipped'] += len(own)
+            elif rows is None or first_id > self.last_id + 1 or foreign_count > self.MAX_EVENT_ROWS:
+                # Часть журнала уже удалена или изменений слишком много - перезагружаем таблицы целиком
+                self.metrics['full_reloads'] += 1
+                entities = {self.TABLE_ENTITIES[table] for table in changed_tables if table in self.TABLE_ENTITIES}
+                for entity in entities:
+                    self.bus.publish(entity, ChangeEvent.UPDATED)
+            else:
+                self.metrics['own_skipped'] += sum(1 for row in rows if row[0] in own)
+                self.publish_rows([row[1:] for row in rows if row[0] not in own])
+            self.last_id = max_id
+            self.prune(first_id, max_id)
+        except sqlite3.Error as e:
+            print(f"Ошибка проверки изменений базы: {e}")
+    
+    def publish_rows(self, rows):
+        """Объединяет записи журнала по сущностям и рассылает по одному событию на действие"""
+        changes = {}  # Сущность -> {id записи: действие}
+        for table, row_id, action in rows:
+            entity = self.TABLE_ENTITIES.get(table)
+            if entity is None or row_id is None:
+                continue
+            if table in ('order_items', 'order_overrides', 'excel_order_overrides'):
+                action = 'update'  # Позиции и правки меняют сам заказ
+            entity_changes = changes.setdefault(entity, {})
+            previous = entity_changes.get(row_id)
+            if action == 'update' and previous in ('insert', 'delete'):
+                continue
+            entity_changes[row_id] = action
+        
+        for entity, entity_changes in changes.items():
+            for action in ('insert', 'update', 'delete'):
+                ids = [row_id for row_id, row_action in entity_changes.items() if row_action == action]
+                if ids:
+                    self.metrics['events'] += 1
+                    self.bus.publish(entity, self.ACTIONS[action], ids)
+    
+    def prune(self, first_id, max_id):
+        """Удаляет старые записи журнала"""
+        if max_id - first_id < self.MAX_LOG_ROWS:
+            return
+        try:
+            with self.conn:
+                self.conn.execute('DELETE FROM change_log WHERE id <= ?', (max_id - self.MAX_LOG_ROWS,))
+        except sqlite3.OperationalError:
+            pass  # База занята записью - удалим при следующем опросе
+
+class OrderRepository:
+    """Доступ к заказам из базы и из Excel по номеру заказа.
+    
+    Заказы базы читаются одним запросом по первичному ключу, заказы из Excel
+    ищутся в словаре номер -> заказ, который перестраивается только
+    при изменении файла.
+    """
+    
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._lock = threading.Lock()
+        self._source = None  # Разобранные данные файла, по которым построен индекс
+        self._excel_index = {}
+    
+    def excel_index(self):
+        """Возвращает индекс заказов из Excel, перестраивая его при изменении файла"""
+        db_manager = self.db_manager
+        source = db_manager.excel_cache.get(db_manager.ORDERS_FILE, db_manager.parse_orders_excel)
+        with self._lock:
+            if source is self._source:
+                return self._excel_index
+        
+        index = {str(order[0]): order for order in db_manager.get_orders_from_excel()}
+        with self._lock:
+            self._source = source
+            self._excel_index = index
+        return index
+    
+    def get(self, order_id):
+        """Возвращает заказ в формате get_orders или None"""
+        order = self.db_manager.get_orders_from_db(order_id)
+        if order:
+            return order[0]
+        if self.db_manager.is_imported('orders'):
+            return None
+        
+        order = self.excel_index().get(str(order_id))
+        if order is None:
+            return None
+        return self.db_manager.apply_order_overrides([order], order_id)[0]
 
 class DatabaseManager:
     """Менеджер базы данных"""
     
-    def __init__(self, db_path='bookstore.db'):
+    ORDERS_FILE = "Модуль 1/Прил_2_ОЗ_КОД 09.02.07-2-2026-М1/orders.xlsx"
+    
+    def __init__(self, db_path='bookstore.db', pool_size=5, excel_cache_path='excel_cache.json',
+                 storage_settings=None):
         self.db_path = db_path
-        self.order_updates = {}  # Кэш для обновлений заказов
+        self.storage = storage_settings or StorageSettings.load()  # Режим журнала, PRAGMA, пороги WAL
+        self.queries = create_registry()  # Именованные запросы, см. queries.py
+        self.pool = ConnectionPool(db_path, size=pool_size, settings=self.storage,
+                                   cached_statements=self.queries.cache_size,
+                                   on_open=self.track_own_changes)
+        self.excel_cache = WorkbookCache(excel_cache_path)  # Разобранные данные Excel по отпечатку файла
+        self.orders = OrderRepository(self)
+        self.changes = ChangeBus()  # События об изменении книг, заказов и пользователей
+        self.watcher = None  # Изменения из других копий приложения, см. start_change_watcher
+        self.fts_enabled = self.upgrade_schema()
+        
+        # WAL переносится в файл базы в фоне, не дожидаясь автоматической контрольной точки
+        self.checkpointer = Checkpointer(db_path, self.storage)
+        self.checkpointer.start()
+    
+    def connection(self):
+        """Контекстный менеджер для работы с подключением из пула"""
+        return self.pool.connection()
+    
+    def storage_stats(self):
+        """Возвращает настройки хранения, режим журнала и метрики контрольных точек"""
+        with self.connection() as conn:
+            journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        return {
+            'journal_mode': journal_mode,
+            'settings': self.storage.as_dict(),
+            'wal_bytes': self.checkpointer.wal_size(),
+            'checkpoints': dict(self.checkpointer.metrics),
+        }
+    
+    def query_stats(self):
+        """Возвращает число вызовов, строк и время выполнения по каждому запросу"""
+        return self.queries.stats()
+    
+    def start_change_watcher(self, interval_ms=None):
+        """Начинает следить за изменениями, сделанными другими копиями приложения"""
+        if self.watcher is None:
+            self.watcher = ChangeWatcher(self.db_path, self.changes, interval_ms)
+            self.watcher.start()
+        return self.watcher
+    
+    def track_own_changes(self, conn):
+        """Отмечает записи журнала изменений, сделанные этим соединением.
+        
+        Временный триггер срабатывает только на записи своего соединения и
+        копирует id записи журнала во временную таблицу own_changes.
+        """
+        try:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS own_changes (id INTEGER PRIMARY KEY)')
+            conn.execute('''
+                CREATE TEMP TRIGGER IF NOT EXISTS change_log_own AFTER INSERT ON main.change_log
+                BEGIN INSERT INTO own_changes (id) VALUES (NEW.id); END
+            ''')
+        except sqlite3.Error:
+            pass  # Журнала еще нет, триггер создаст upgrade_schema
+    
+    def take_own_changes(self):
+        """Забирает id записей журнала, сделанных текущей транзакцией"""
+        with self.connection() as conn:
+            try:
+                rows = conn.execute('SELECT id FROM temp.own_changes').fetchall()
+                conn.execute('DELETE FROM temp.own_changes')
+            except sqlite3.Error:
+                return []
+        return [row[0] for row in rows]
+    
+    def publish(self, entity, action, ids=None):
+        """Сообщает подписчикам об изменении после фиксации текущей транзакции"""
+        own_ids = self.take_own_changes()
+        
+        def notify():
+            # Эти записи журнала наблюдатель уже не должен рассылать повторно
+            if self.watcher is not None and own_ids:
+                self.watcher.skip(own_ids)
+            self.changes.publish(entity, action, ids)
+        self.pool.after_commit(notify)
+    
+    def upgrade_schema(self):
+        """Добавляет в существующую базу поисковые колонки, индексы и поля импорта.
+        
+        Возвращает True, если доступен полнотекстовый поиск.
+        """
+        from create_db import (create_catalog_indexes, create_normalized_columns, create_search_index,
+                               create_import_tables, create_order_overrides, create_change_tracking)
+        try:
+            # Режим журнала меняется вне транзакции
+            with self.connection() as conn:
+                enable_journal_mode(conn, self.storage)
+        except sqlite3.Error as e:
+            print(f"Не удалось включить режим журнала {self.storage.journal_mode}: {e}")
+        try:
+            with self.connection() as conn:
+                create_normalized_columns(conn.cursor())
+                create_catalog_indexes(conn.cursor())
+                create_import_tables(conn.cursor())
+                create_order_overrides(conn.cursor())
+                create_change_tracking(conn.cursor())
+                self.track_own_changes(conn)
+        except sqlite3.Error as e:
+            print(f"Не удалось обновить структуру базы данных: {e}")
+        try:
+            with self.connection() as conn:
+                return create_search_index(conn.cursor())
+        except sqlite3.Error as e:
+            print(f"Полнотекстовый поиск недоступен: {e}")
+            return False
+    
+    def build_search_match(self, search_query):
+        """Преобразует строку поиска в запрос FTS5 с поиском по префиксам"""
+        terms = normalize_text(search_query).split()
+        return ' '.join(f'"{term}"*' for term in terms)
     
-    def get_connection(self):
-        """Получает подключение к базе данных"""
-        return sqlite3.connect(self.db_path)
+    def prefix_range(self, prefix):
+        """Возвращает границы диапазона строк, начинающихся с prefix (для индексного поиска)"""
+        return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
     
     def authenticate_user(self, login, password):
         """Аутентификация пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, full_name, role FROM users 
-            WHERE login = ? AND password = ?
-        ''', (login, password))
-        
-        result = cursor.fetchone()
-        conn.close()
+        with self.connection() as conn:
+            result = self.queries.fetchone(conn, 'users.authenticate', (login, password))
         
         if result:
             return {
@@ -53,109 +607,150 @@ class DatabaseManager:
             }
         return None
     
-    def get_books(self, search_query=None, genre_filter=None, sort_by='title'):
-        """Получает список книг с фильтрацией и сортировкой"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        query = '''
-            SELECT b.id, b.title, b.author, g.name as genre, p.name as publisher,
-                   b.year, b.price, b.stock_quantity, b.is_on_sale, b.discount_price,
-                   b.cover_image, b.description
-            FROM books b
-            JOIN genres g ON b.genre_id = g.id
-            JOIN publishers p ON b.publisher_id = p.id
-            WHERE 1=1
-        '''
+    def books_filter(self, search_query=None, genre_filter=None):
+        """Определяет вариант поиска каталога и параметры поиска и фильтра по жанру.
         
+        Возвращает (вариант поиска из queries.SEARCH_MODES, параметры).
+        """
         params = []
-        
-        if search_query:
-            query += ' AND (b.title LIKE ? OR b.author LIKE ?)'
+        match = self.build_search_match(search_query) if search_query and self.fts_enabled else ''
+        normalized_query = normalize_text(search_query) if search_query and not match else ''
+        
+        if match:
+            search_mode = 'fts'
+            params.append(match)
+        elif normalized_query:
+            search_mode = 'prefix'
+            low, high = self.prefix_range(normalized_query)
+            params.extend([low, high, low, high])
+        elif search_query:
+            search_mode = 'like'
             params.extend([f'%{search_query}%', f'%{search_query}%'])
+        else:
+            search_mode = None
         
         if genre_filter:
-            query += ' AND g.name = ?'
             params.append(genre_filter)
         
-        # Сортировка
-        if sort_by == 'title':
-            query += ' ORDER BY b.title'
-        elif sort_by == 'author':
-            query += ' ORDER BY b.author'
-        elif sort_by == 'price':
-            query += ' ORDER BY b.price'
-        elif sort_by == 'year':
-            query += ' ORDER BY b.year DESC'
-        
-        cursor.execute(query, params)
-        books = cursor.fetchall()
-        conn.close()
-        
-        # Убираем дубликаты по названию и автору (оставляем только первую запись)
-        seen_books = set()
-        unique_books = []
-        for book in books:
-            book_key = (book[1].lower().strip(), book[2].lower().strip())  # title, author
-            if book_key not in seen_books:
-                seen_books.add(book_key)
-                unique_books.append(book)
-        
-        return unique_books
+        return search_mode, params
+    
+    def get_books(self, search_query=None, genre_filter=None, sort_by='title'):
+        """Получает список книг с фильтрацией и сортировкой"""
+        search_mode, params = self.books_filter(search_query, genre_filter)
+        if sort_by not in BOOK_SORT_COLUMNS or sort_by == 'relevance':
+            sort_by = None
+        name = book_query_name('list', search_mode, genre_filter, sort_by)
+        
+        with self.connection() as conn:
+            return self.queries.fetchall(conn, name, params)
+    
+    def get_books_page(self, after_key=None, limit=40, sort_by='title', filters=None):
+        """Получает очередную страницу каталога (постраничная выборка по ключу).
+        
+        after_key - ключ последней книги предыдущей страницы (значение сортировки, id)
+        или None для первой страницы. filters - словарь с ключами 'search' и 'genre'.
+        Возвращает (книги, ключ для следующей страницы или None).
+        """
+        filters = filters or {}
+        search_mode, params = self.books_filter(filters.get('search'), filters.get('genre'))
+        
+        if sort_by not in BOOK_SORT_COLUMNS or (sort_by == 'relevance' and search_mode != 'fts'):
+            sort_by = 'title'
+        name = book_query_name('page', search_mode, filters.get('genre'), sort_by, after_key is not None)
+        
+        if after_key is not None:
+            params.extend(after_key)
+        params.append(limit)
+        
+        with self.connection() as conn:
+            rows = self.queries.fetchall(conn, name, params)
+        
+        next_key = (rows[-1][0], rows[-1][1]) if len(rows) == limit else None
+        return [row[1:] for row in rows], next_key
     
     def get_genres(self):
         """Получает список жанров"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, name FROM genres ORDER BY name')
-        genres = cursor.fetchall()
-        conn.close()
-        return genres
+        with self.connection() as conn:
+            return self.queries.fetchall(conn, 'genres.list')
     
     def get_orders(self):
         """Получает список заказов"""
-        # Сначала пытаемся загрузить заказы из базы данных
+        # Сначала пытаемся загрузить заказы из базы данных (правки уже учтены запросом)
         db_orders = self.get_orders_from_db()
         
-        # Затем загружаем заказы из Excel файла
-        excel_orders = self.get_orders_from_excel()
+        # Затем загружаем заказы из Excel файла.
+        # После импорта они уже в базе, и список получается одним запросом
+        excel_orders = [] if self.is_imported('orders') else self.apply_order_overrides(self.get_orders_from_excel())
         
         # Объединяем заказы из базы данных и Excel
         all_orders = db_orders + excel_orders
         
-        # Применяем обновления из кэша
-        for order_id, updates in self.order_updates.items():
-            for i, order in enumerate(all_orders):
-                if str(order[0]) == str(order_id):
-                    # Обновляем заказ с изменениями
-                    updated_order = list(order)
-                    if 'status' in updates:
-                        updated_order[7] = updates['status']
-                    if 'delivery_date' in updates:
-                        updated_order[3] = updates['delivery_date']
-                    if 'pickup_code' in updates:
-                        updated_order[6] = updates['pickup_code']
-                    all_orders[i] = tuple(updated_order)
-                    break
-        
         print(f"Загружено {len(all_orders)} заказов (из БД: {len(db_orders)}, из Excel: {len(excel_orders)})")
         return all_orders
     
-    def get_orders_from_db(self):
-        """Получает заказы из базы данных"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def save_order_updates(self, order_id, status=None, delivery_date=None, pickup_code=None,
+                           client_name=None, composition=None, from_excel=False):
+        """Сохраняет правки заказа в базе (поля со значением None не меняются).
+        
+        С from_excel order_id - номер заказа из Excel, которого нет в базе.
+        """
+        query = 'excel_order_overrides.upsert' if from_excel else 'order_overrides.upsert'
+        with self.connection() as conn:
+            self.queries.execute(conn, query,
+                                 (int(order_id), status, delivery_date, pickup_code, client_name, composition))
+            self.publish(ChangeEvent.ORDER, ChangeEvent.UPDATED, [order_id])
+    
+    def apply_order_overrides(self, orders, order_id=None):
+        """Подставляет сохраненные правки в заказы, которых нет в базе (из Excel).
+        
+        С order_id читаются правки только этого заказа.
+        """
+        with self.connection() as conn:
+            if order_id is None:
+                rows = self.queries.fetchall(conn, 'excel_order_overrides.list')
+            else:
+                rows = self.queries.fetchall(conn, 'excel_order_overrides.get', (int(order_id),))
+            overrides = {str(row[0]): row[1:] for row in rows}
         
-        cursor.execute('''
-            SELECT o.id, o.user_id, o.pickup_point_id, o.status, o.total_amount, 
-                   o.order_date, o.completion_date, u.full_name
-            FROM orders o
-            LEFT JOIN users u ON o.user_id = u.id
-            ORDER BY o.id DESC
-        ''')
+        if not overrides:
+            return orders
         
-        orders = cursor.fetchall()
-        conn.close()
+        result = []
+        for order in orders:
+            override = overrides.get(str(order[0]))
+            if override is not None:
+                status, delivery_date, pickup_code, client_name, composition = override
+                order = (order[0], composition or order[1], order[2], delivery_date or order[3],
+                         order[4], client_name or order[5], pickup_code or order[6], status or order[7])
+            result.append(order)
+        return result
+    
+    def is_imported(self, source):
+        """Проверяет, загружался ли Excel файл в базу (см. excel_import.py)"""
+        with self.connection() as conn:
+            return self.queries.fetchone(conn, 'excel_imports.exists', (source,)) is not None
+    
+    def import_excel(self, data_dir=None, progress=None, workers=1):
+        """Импортирует книги, пользователей, пункты выдачи и заказы из Excel файлов"""
+        from excel_import import ExcelImporter, DATA_DIR
+        importer = ExcelImporter(self.db_path, data_dir or DATA_DIR, progress=progress, workers=workers)
+        result = importer.run()
+        if self.watcher is not None:
+            # Импорт пишет своим соединением; о нем сообщаем ниже одним событием на сущность
+            with self.connection() as conn:
+                max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM change_log').fetchone()[0]
+            self.watcher.skip(range(self.watcher.last_id + 1, max_id + 1))
+        for entity in (ChangeEvent.BOOK, ChangeEvent.USER, ChangeEvent.ORDER):
+            self.publish(entity, ChangeEvent.UPDATED)
+        return result
+    
+    def get_orders_from_db(self, order_id=None):
+        """Получает заказы из базы данных (с order_id - только этот заказ)"""
+        with self.connection() as conn:
+            if order_id is None:
+                orders = self.queries.fetchall(conn, 'orders.list')
+            else:
+                orders = self.queries.fetchall(conn, 'orders.get', (int(order_id),))
         
         # Преобразуем данные из БД в нужный формат
         formatted_orders = []
@@ -211,23 +806,14 @@ class DatabaseManager:
                 'completed': 'Доставлен',
                 'cancelled': 'Отменен'
             }
+            # Статус заказа из базы хранится только в orders.status (см. update_order_status)
             display_status = status_mapping.get(order[3], order[3])
             
-            # Получаем дополнительные данные из кэша
-            order_id = order[0]
-            client_name = order[7] or 'Пользователь'
-            composition = 'Состав заказа'
-            pickup_code = ''
-            
-            # Проверяем кэш для этого заказа
-            if order_id in self.order_updates:
-                cache_data = self.order_updates[order_id]
-                if 'client_name' in cache_data:
-                    client_name = cache_data['client_name']
-                if 'composition' in cache_data:
-                    composition = cache_data['composition']
-                if 'pickup_code' in cache_data:
-                    pickup_code = cache_data['pickup_code']
+            # Правки, сохраненные в order_overrides, важнее исходных данных
+            delivery_date = order[10] or delivery_date
+            pickup_code = order[11] or order[8] or ''
+            client_name = order[12] or order[7] or 'Пользователь'
+            composition = order[13] or order[9] or 'Состав заказа'
             
             formatted_order = (
                 order[0],  # ID заказа
@@ -245,30 +831,11 @@ class DatabaseManager:
     
     def get_orders_from_excel(self):
         """Получает заказы из Excel файла"""
-        # Пытаемся загрузить заказы из Excel файла
-        orders_data = self.load_orders_from_excel()
-        
-        if orders_data:
-            # Преобразуем данные из Excel в нужный формат
-            orders = []
-            for i, order_data in enumerate(orders_data):
-                # Конвертируем даты из Excel формата
-                order_date = self.excel_date_to_string(order_data.get('Дата заказа', ''))
-                delivery_date = self.excel_date_to_string(order_data.get('Дата доставки', ''))
-                
-                order = (
-                    order_data.get('Номер заказа', i + 1001),
-                    order_data.get('Состав заказа (Артикул, Кол-во)', ''),
-                    order_date,
-                    delivery_date,
-                    order_data.get('ID Пункта выдачи', 0),
-                    order_data.get('ФИО клиента', ''),
-                    order_data.get('Код для получения', ''),
-                    order_data.get('Статус заказа', 'Новый')
-                )
-                orders.append(order)
-            
-            return orders
+        # Файл перечитывается, только если он изменился с прошлого разбора
+        orders = self.excel_cache.get(self.ORDERS_FILE, self.parse_orders_excel)
+        
+        if orders:
+            return [tuple(order) for order in orders]
         else:
             # Если не удалось загрузить из Excel, используем тестовые данные
             test_orders = [
@@ -286,26 +853,47 @@ class DatabaseManager:
             
             return test_orders
     
-    def get_order_items(self, order_id):
-        """Получает позиции заказа"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def parse_orders_excel(self, file_path):
+        """Читает orders.xlsx и преобразует строки в формат списка заказов"""
+        orders_data = self.load_orders_from_excel(file_path)
         
-        query = '''
-            SELECT b.title, oi.quantity, oi.price
-            FROM order_items oi
-            JOIN books b ON oi.book_id = b.id
-            WHERE oi.order_id = ?
-        '''
+        # Преобразуем данные из Excel в нужный формат
+        orders = []
+        for i, order_data in enumerate(orders_data):
+            # Пустые ячейки приходят как None - для них берем значения по умолчанию
+            order_data = {key: value for key, value in order_data.items() if value is not None}
+            
+            # Конвертируем даты из Excel формата
+            order_date = self.excel_date_to_string(order_data.get('Дата заказа', ''))
+            delivery_date = self.excel_date_to_string(order_data.get('Дата доставки', ''))
+            
+            order = (
+                order_data.get('Номер заказа', i + 1001),
+                str(order_data.get('Состав заказа (Артикул, Кол-во)', '')),
+                order_date,
+                delivery_date,
+                order_data.get('ID Пункта выдачи', 0),
+                str(order_data.get('ФИО клиента', '')),
+                str(order_data.get('Код для получения', '')),
+                str(order_data.get('Статус заказа', 'Новый'))
+            )
+            orders.append(order)
         
-        cursor.execute(query, (order_id,))
-        items = cursor.fetchall()
-        conn.close()
+        return orders
+    
+    def get_order_items(self, order_id):
+        """Получает позиции заказа"""
+        with self.connection() as conn:
+            items = self.queries.fetchall(conn, 'order_items.list', (order_id,))
         
         return items
     
     def update_order_status(self, order_id, status):
-        """Обновляет статус заказа"""
+        """Обновляет статус заказа.
+        
+        Возвращает False, если заказа нет в базе (заказ из Excel): его статус
+        сохраняется через save_order_updates.
+        """
         # Преобразуем статус из отображаемого формата в формат БД
         status_mapping = {
             'Новый': 'pending',
@@ -316,164 +904,135 @@ class DatabaseManager:
         }
         db_status = status_mapping.get(status, status)
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE orders SET status = ? WHERE id = ?
-        ''', (db_status, order_id))
-        
-        conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            cursor = self.queries.execute(conn, 'orders.update_status', (db_status, order_id))
+            if cursor.rowcount:
+                self.publish(ChangeEvent.ORDER, ChangeEvent.UPDATED, [order_id])
+            return cursor.rowcount > 0
     
     def add_book(self, title, author, genre_id, publisher_id, year, price, 
                  stock_quantity, is_on_sale=False, discount_price=None, 
                  cover_image='placeholder.png', description=''):
-        """Добавляет новую книгу"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO books (title, author, genre_id, publisher_id, year, price,
-                             stock_quantity, is_on_sale, discount_price, cover_image, description)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (title, author, genre_id, publisher_id, year, price, stock_quantity,
-              is_on_sale, discount_price, cover_image, description))
-        
-        conn.commit()
-        conn.close()
+        """Добавляет новую книгу и возвращает ее id"""
+        with self.connection() as conn:
+            cursor = self.queries.execute(conn, 'books.insert', (title, author, genre_id, publisher_id, year, price, stock_quantity,
+                  is_on_sale, discount_price, cover_image, description,
+                  normalize_text(title), normalize_text(author)))
+            book_id = cursor.lastrowid
+            self.publish(ChangeEvent.BOOK, ChangeEvent.INSERTED, [book_id])
+        self.prepare_thumbnail(cover_image)
+        return book_id
     
     def update_book(self, book_id, title, author, genre_id, publisher_id, year, 
                    price, stock_quantity, is_on_sale=False, discount_price=None, 
                    cover_image='placeholder.png', description=''):
         """Обновляет книгу"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Проверяем, существует ли книга
-        cursor.execute('SELECT id FROM books WHERE id = ?', (book_id,))
-        if not cursor.fetchone():
-            print(f"Книга с ID {book_id} не найдена")
-            conn.close()
-            return False
+        with self.connection() as conn:
+            # Проверяем, существует ли книга
+            if not self.queries.fetchone(conn, 'books.exists', (book_id,)):
+                print(f"Книга с ID {book_id} не найдена")
+                return False
+            
+            # Обновляем книгу
+            cursor = self.queries.execute(conn, 'books.update', (title, author, genre_id, publisher_id, year, price, stock_quantity,
+                  is_on_sale, discount_price, cover_image, description,
+                  normalize_text(title), normalize_text(author), book_id))
+            
+            # Проверяем, сколько строк было обновлено
+            rows_affected = cursor.rowcount
+            print(f"Обновлено строк: {rows_affected} для книги ID {book_id}")
+            if rows_affected:
+                self.publish(ChangeEvent.BOOK, ChangeEvent.UPDATED, [book_id])
         
-        # Обновляем книгу
-        cursor.execute('''
-            UPDATE books SET title=?, author=?, genre_id=?, publisher_id=?, year=?,
-                           price=?, stock_quantity=?, is_on_sale=?, discount_price=?,
-                           cover_image=?, description=?
-            WHERE id=?
-        ''', (title, author, genre_id, publisher_id, year, price, stock_quantity,
-              is_on_sale, discount_price, cover_image, description, book_id))
-        
-        # Проверяем, сколько строк было обновлено
-        rows_affected = cursor.rowcount
-        print(f"Обновлено строк: {rows_affected} для книги ID {book_id}")
-        
-        conn.commit()
-        conn.close()
+        self.prepare_thumbnail(cover_image)
         return rows_affected > 0
     
+    def prepare_thumbnail(self, cover_image):
+        """Заранее готовит миниатюру обложки для каталога"""
+        try:
+            thumbnail_store.get(cover_image, *THUMBNAIL_SIZE)
+        except OSError as e:
+            print(f"Не удалось подготовить миниатюру {cover_image}: {e}")
+    
+    def get_book_row(self, book_id):
+        """Получает одну книгу в формате get_books или None"""
+        with self.connection() as conn:
+            return self.queries.fetchone(conn, 'books.get', (book_id,))
+    
+    def get_book(self, book_id):
+        """Получает данные книги для редактирования"""
+        with self.connection() as conn:
+            return self.queries.fetchone(conn, 'books.edit_data', (book_id,))
+    
     def delete_book(self, book_id):
         """Удаляет книгу"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM books WHERE id = ?', (book_id,))
-        conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            self.queries.execute(conn, 'books.delete', (book_id,))
+            self.publish(ChangeEvent.BOOK, ChangeEvent.DELETED, [book_id])
     
     def get_users(self):
         """Получает список пользователей"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, login, full_name, role FROM users ORDER BY role, full_name')
-        users = cursor.fetchall()
-        conn.close()
-        return users
+        with self.connection() as conn:
+            return self.queries.fetchall(conn, 'users.list')
+    
+    def get_user_row(self, user_id):
+        """Получает одного пользователя в формате get_users или None"""
+        with self.connection() as conn:
+            return self.queries.fetchone(conn, 'users.get', (user_id,))
     
     def add_user(self, login, password, full_name, role):
-        """Добавляет нового пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO users (login, password, full_name, role)
-            VALUES (?, ?, ?, ?)
-        ''', (login, password, full_name, role))
-        
-        conn.commit()
-        conn.close()
+        """Добавляет нового пользователя и возвращает его id"""
+        with self.connection() as conn:
+            cursor = self.queries.execute(conn, 'users.insert', (login, password, full_name, role))
+            self.publish(ChangeEvent.USER, ChangeEvent.INSERTED, [cursor.lastrowid])
+            return cursor.lastrowid
     
     def update_user(self, user_id, login, password, full_name, role):
         """Обновляет пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE users SET login=?, password=?, full_name=?, role=?
-            WHERE id=?
-        ''', (login, password, full_name, role, user_id))
-        
-        conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            self.queries.execute(conn, 'users.update', (login, password, full_name, role, user_id))
+            self.publish(ChangeEvent.USER, ChangeEvent.UPDATED, [user_id])
     
     def delete_user(self, user_id):
         """Удаляет пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
-        conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            self.queries.execute(conn, 'users.delete', (user_id,))
+            self.publish(ChangeEvent.USER, ChangeEvent.DELETED, [user_id])
     
     def get_publishers(self):
         """Получает список издательств"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, name FROM publishers ORDER BY name')
-        publishers = cursor.fetchall()
-        conn.close()
-        return publishers
+        with self.connection() as conn:
+            return self.queries.fetchall(conn, 'publishers.list')
     
     def add_publisher(self, name):
         """Добавляет издательство"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO publishers (name) VALUES (?)', (name,))
-        conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            self.queries.execute(conn, 'publishers.insert', (name,))
     
     def add_genre(self, name):
         """Добавляет жанр"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO genres (name) VALUES (?)', (name,))
-        conn.commit()
-        conn.close()
+        with self.connection() as conn:
+            self.queries.execute(conn, 'genres.insert', (name,))
     
-    def add_order(self, user_id, pickup_point_id, order_items, total_amount, order_date, completion_date):
-        """Добавляет новый заказ"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Добавляем заказ
-        cursor.execute('''
-            INSERT INTO orders (user_id, pickup_point_id, total_amount, order_date, completion_date, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, pickup_point_id, total_amount, order_date, completion_date, 'pending'))
+    def _insert_order(self, cursor, user_id, pickup_point_id, order_items, total_amount,
+                      order_date, completion_date, db_status):
+        """Добавляет заказ и его позиции в рамках текущей транзакции"""
+        self.queries.execute(cursor, 'orders.insert', (user_id, pickup_point_id, total_amount, order_date, completion_date, db_status))
         
         order_id = cursor.lastrowid
         
         # Добавляем позиции заказа
-        for book_id, quantity, price in order_items:
-            cursor.execute('''
-                INSERT INTO order_items (order_id, book_id, quantity, price)
-                VALUES (?, ?, ?, ?)
-            ''', (order_id, book_id, quantity, price))
-        
-        conn.commit()
-        conn.close()
+        self.queries.executemany(cursor, 'order_items.insert', [(order_id, book_id, quantity, price) for book_id, quantity, price in order_items])
+        
+        self.publish(ChangeEvent.ORDER, ChangeEvent.INSERTED, [order_id])
         return order_id
     
+    def add_order(self, user_id, pickup_point_id, order_items, total_amount, order_date, completion_date):
+        """Добавляет новый заказ"""
+        with self.connection() as conn:
+            return self._insert_order(conn.cursor(), user_id, pickup_point_id, order_items,
+                                      total_amount, order_date, completion_date, 'pending')
+    
     def add_order_with_status(self, user_id, pickup_point_id, order_items, total_amount, order_date, completion_date, status):
         """Добавляет новый заказ с указанным статусом"""
         # Преобразуем статус из отображаемого формата в формат БД
@@ -486,27 +1045,9 @@ class DatabaseManager:
         }
         db_status = status_mapping.get(status, 'pending')
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Добавляем заказ
-        cursor.execute('''
-            INSERT INTO orders (user_id, pickup_point_id, total_amount, order_date, completion_date, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, pickup_point_id, total_amount, order_date, completion_date, db_status))
-        
-        order_id = cursor.lastrowid
-        
-        # Добавляем позиции заказа
-        for book_id, quantity, price in order_items:
-            cursor.execute('''
-                INSERT INTO order_items (order_id, book_id, quantity, price)
-                VALUES (?, ?, ?, ?)
-            ''', (order_id, book_id, quantity, price))
-        
-        conn.commit()
-        conn.close()
-        return order_id
+        with self.connection() as conn:
+            return self._insert_order(conn.cursor(), user_id, pickup_point_id, order_items,
+                                      total_amount, order_date, completion_date, db_status)
     
     def add_order_with_details(self, pickup_point_id, order_items, total_amount, order_date, completion_date, status, client_name, composition, pickup_code):
         """Добавляет новый заказ с полными деталями"""
@@ -520,62 +1061,37 @@ class DatabaseManager:
         }
         db_status = status_mapping.get(status, 'pending')
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Добавляем заказ
-        cursor.execute('''
-            INSERT INTO orders (user_id, pickup_point_id, total_amount, order_date, completion_date, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (1, pickup_point_id, total_amount, order_date, completion_date, db_status))
-        
-        order_id = cursor.lastrowid
+        with self.connection() as conn:
+            order_id = self._insert_order(conn.cursor(), 1, pickup_point_id, order_items,
+                                          total_amount, order_date, completion_date, db_status)
+            
+            # Дополнительные данные для отображения сохраняем в той же транзакции
+            self.save_order_updates(order_id, client_name=client_name,
+                                    composition=composition, pickup_code=pickup_code)
         
-        # Добавляем позиции заказа
-        for book_id, quantity, price in order_items:
-            cursor.execute('''
-                INSERT INTO order_items (order_id, book_id, quantity, price)
-                VALUES (?, ?, ?, ?)
-            ''', (order_id, book_id, quantity, price))
-        
-        # Сохраняем дополнительные данные в кэш для отображения
-        if order_id not in self.order_updates:
-            self.order_updates[order_id] = {}
-        
-        self.order_updates[order_id]['client_name'] = client_name
-        self.order_updates[order_id]['composition'] = composition
-        self.order_updates[order_id]['pickup_code'] = pickup_code
-        
-        conn.commit()
-        conn.close()
         return order_id
     
     def deleteorder(self, order_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM order_items WHERE order_id = ?", (order_id,))
-        cursor.execute("DELETE FROM orders WHERE id = ?", (order_id,))
-        conn.commit()
-        conn.close()
-
-
+        with self.connection() as conn:
+            self.queries.execute(conn, 'order_items.delete', (order_id,))
+            self.queries.execute(conn, 'orders.delete', (order_id,))
+            self.queries.execute(conn, 'order_overrides.delete', (order_id,))
+            self.publish(ChangeEvent.ORDER, ChangeEvent.DELETED, [order_id])
+    
+    def get_order(self, order_id):
+        """Получает заказ из базы или Excel по номеру (см. OrderRepository)"""
+        return self.orders.get(order_id)
     
     def get_order_by_id(self, order_id):
         """Получает заказ по ID"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, user_id, pickup_point_id, status, total_amount, order_date, completion_date
-            FROM orders WHERE id = ?
-        ''', (order_id,))
-        
-        order = cursor.fetchone()
-        conn.close()
-        return order
+        with self.connection() as conn:
+            return self.queries.fetchone(conn, 'orders.get_raw', (order_id,))
     
     def excel_date_to_string(self, excel_date):
         """Конвертирует Excel дату в читаемую строку"""
+        # Ячейки с форматом даты excel_reader уже возвращает как date
+        if hasattr(excel_date, 'strftime'):
+            return excel_date.strftime('%d.%m.%Y')
         try:
             # Excel даты начинаются с 1 января 1900 года
             # Нужно вычесть 2 дня из-за особенностей Excel
@@ -589,81 +1105,14 @@ class DatabaseManager:
     def read_excel_file(self, file_path):
         """Читает Excel файл (.xlsx) и возвращает данные в виде списка словарей"""
         try:
-            # Excel файлы - это zip архивы
-            with zipfile.ZipFile(file_path, 'r') as zip_file:
-                # Читаем sharedStrings.xml для строковых значений
-                shared_strings = {}
-                try:
-                    with zip_file.open('xl/sharedStrings.xml') as f:
-                        tree = ET.parse(f)
-                        root = tree.getroot()
-                        for i, si in enumerate(root.findall('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}si')):
-                            text_elem = si.find('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t')
-                            if text_elem is not None:
-                                shared_strings[i] = text_elem.text or ""
-                except:
-                    pass
-                
-                # Читаем worksheet
-                worksheet_path = 'xl/worksheets/sheet1.xml'
-                if worksheet_path not in zip_file.namelist():
-                    # Ищем первый worksheet
-                    for name in zip_file.namelist():
-                        if name.startswith('xl/worksheets/sheet') and name.endswith('.xml'):
-                            worksheet_path = name
-                            break
-                
-                with zip_file.open(worksheet_path) as f:
-                    tree = ET.parse(f)
-                    root = tree.getroot()
-                    
-                    # Находим все строки
-                    rows = root.findall('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}row')
-                    
-                    data = []
-                    headers = []
-                    
-                    for row_idx, row in enumerate(rows):
-                        cells = row.findall('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}c')
-                        row_data = []
-                        
-                        for cell in cells:
-                            cell_type = cell.get('t', '')
-                            cell_value = ''
-                            
-                            # Получаем значение ячейки
-                            value_elem = cell.find('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}v')
-                            if value_elem is not None:
-                                cell_value = value_elem.text or ''
-                                
-                                # Если это строка, получаем из sharedStrings
-                                if cell_type == 's' and cell_value.isdigit():
-                                    cell_value = shared_strings.get(int(cell_value), '')
-                            
-                            row_data.append(cell_value)
-                        
-                        if row_data:
-                            if row_idx == 0:
-                                # Первая строка - заголовки
-                                headers = row_data
-                            else:
-                                # Остальные строки - данные
-                                if len(row_data) == len(headers):
-                                    row_dict = {}
-                                    for i, header in enumerate(headers):
-                                        if i < len(row_data):
-                                            row_dict[header] = row_data[i]
-                                    data.append(row_dict)
-                    
-                    return data
-                    
+            # Строки читаются потоково, см. excel_reader.iter_records
+            return list(iter_records(file_path))
         except Exception as e:
             print(f"Ошибка при чтении Excel файла: {e}")
             return []
     
-    def load_orders_from_excel(self):
+    def load_orders_from_excel(self, file_path=ORDERS_FILE):
         """Загружает заказы из файла orders.xlsx"""
-        file_path = "Модуль 1/Прил_2_ОЗ_КОД 09.02.07-2-2026-М1/orders.xlsx"
         
         if not os.path.exists(file_path):
             print(f"Файл {file_path} не найден")
@@ -851,8 +1300,7 @@ class LoginWindow(QWidget):
             QMessageBox.warning(self, 'Ошибка', 'Введите логин и пароль')
             return
         
-        db_manager = DatabaseManager()
-        user = db_manager.authenticate_user(login, password)
+        user = self.parent.db_manager.authenticate_user(login, password)
         
         if user:
             self.parent.current_user = user
@@ -869,156 +1317,524 @@ class LoginWindow(QWidget):
         }
         self.parent.show_main_window()
 
-class BookCard(QFrame):
-    """Карточка книги"""
+class QueryTaskSignals(QObject):
+    """Сигналы фоновой задачи (QRunnable не может сам отправлять сигналы)"""
+    
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+class QueryTask(QRunnable):
+    """Фоновая задача: вызывает функцию доступа к данным в потоке пула"""
+    
+    def __init__(self, token, func, args):
+        super().__init__()
+        self.token = token
+        self.func = func
+        self.args = args
+        self.signals = QueryTaskSignals()
+        self.setAutoDelete(False)  # Задачей владеет AsyncQueryRunner
+    
+    def run(self):
+        try:
+            result = self.func(*self.args)
+        except Exception as e:
+            self.signals.failed.emit(self.token, str(e))
+        else:
+            self.signals.finished.emit(self.token, result)
+
+class AsyncQueryRunner(QObject):
+    """Выполняет запросы к базе данных вне потока интерфейса.
     
-    def __init__(self, book_data, parent=None):
+    Запросы объединяются в каналы: новый запрос в канале отменяет еще не начатый
+    предыдущий, а результаты устаревших запросов отбрасываются.
+    """
+    
+    def __init__(self, parent=None, thread_pool=None):
         super().__init__(parent)
-        self.book_data = book_data
-        self.init_ui()
+        self.thread_pool = thread_pool or QThreadPool.globalInstance()
+        self.tokens = itertools.count(1)
+        self.latest = {}  # канал -> токен последнего запроса
+        self.tasks = {}   # токен -> (канал, задача, on_result, on_error)
+    
+    def submit(self, channel, func, *args, on_result=None, on_error=None):
+        """Ставит запрос в очередь пула потоков и возвращает его токен"""
+        # Еще не начатый предыдущий запрос канала больше не нужен
+        previous = self.latest.get(channel)
+        if previous in self.tasks and self.thread_pool.tryTake(self.tasks[previous][1]):
+            del self.tasks[previous]
+        
+        token = next(self.tokens)
+        task = QueryTask(token, func, args)
+        task.signals.finished.connect(self.on_finished)
+        task.signals.failed.connect(self.on_failed)
+        self.latest[channel] = token
+        self.tasks[token] = (channel, task, on_result, on_error)
+        self.thread_pool.start(task)
+        return token
+    
+    def is_pending(self, channel):
+        """Есть ли в канале запрос, результат которого еще не получен"""
+        return self.latest.get(channel) in self.tasks
+    
+    def take_task(self, token):
+        """Снимает задачу с учета; возвращает None для устаревшего результата"""
+        channel, task, on_result, on_error = self.tasks.pop(token, (None, None, None, None))
+        if channel is None or self.latest.get(channel) != token:
+            return None
+        return on_result, on_error
+    
+    def on_finished(self, token, result):
+        callbacks = self.take_task(token)
+        if callbacks and callbacks[0]:
+            callbacks[0](result)
+    
+    def on_failed(self, token, message):
+        callbacks = self.take_task(token)
+        if callbacks is None:
+            return
+        print(f"Ошибка фонового запроса: {message}")
+        if callbacks[1]:
+            callbacks[1](message)
+
+def create_loading_label(text='Загрузка...'):
+    """Создает надпись, которая показывается, пока данные загружаются"""
+    label = QLabel(text)
+    label.setAlignment(Qt.AlignCenter)
+    label.setStyleSheet("color: #666; font-size: 14px; padding: 10px;")
+    label.hide()
+    return label
+
+
+class BookListModel(QAbstractListModel):
+    """Модель каталога книг с постраничной подгрузкой из базы данных.
     
-    def init_ui(self):
-        self.setFrameStyle(QFrame.Box)
-        self.setLineWidth(1)
-        self.setStyleSheet("""
-            QFrame {
-                background-color: #FFFFFF;
-                border: 2px solid #7FFF00;
-                border-radius: 8px;
-                margin: 8px;
-            }
-            QFrame:hover {
-                border-color: #00FA9A;
-            }
-        """)
+    Страницы запрашиваются в фоновом потоке, сигнал loading_changed
+    сообщает о начале и окончании загрузки.
+    """
+    
+    BookRole = Qt.UserRole + 1
+    
+    loading_changed = pyqtSignal(bool)
+    
+    def __init__(self, db_manager, page_size=40, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.page_size = page_size
+        self.books = []
+        self.next_key = None
+        self.sort_by = 'title'
+        self.filters = {}
+        self.runner = AsyncQueryRunner(self)
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.books)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.books):
+            return None
+        book = self.books[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{book[1]} | {book[2]}"
+        if role == self.BookRole:
+            return book
+        return None
+    
+    def reset_books(self, sort_by, filters):
+        """Запрашивает первую страницу с новыми параметрами.
+        
+        Ответ на предыдущий, еще не выполненный запрос будет отброшен.
+        """
+        self.sort_by = sort_by
+        self.filters = filters
+        self.loading_changed.emit(True)
+        self.runner.submit('page', self.db_manager.get_books_page,
+                           None, self.page_size, sort_by, filters,
+                           on_result=self.on_first_page, on_error=self.on_page_error)
+    
+    def on_first_page(self, result):
+        self.beginResetModel()
+        self.books, self.next_key = result
+        self.endResetModel()
+        self.loading_changed.emit(False)
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return (not parent.isValid() and self.next_key is not None
+                and not self.runner.is_pending('page'))
+    
+    def fetchMore(self, parent=QModelIndex()):
+        """Подгружает следующую страницу, когда представление дошло до конца списка"""
+        if not self.canFetchMore(parent):
+            return
+        self.runner.submit('page', self.db_manager.get_books_page,
+                           self.next_key, self.page_size, self.sort_by, self.filters,
+                           on_result=self.on_next_page, on_error=self.on_page_error)
+    
+    def on_next_page(self, result):
+        books, self.next_key = result
+        if books:
+            first = len(self.books)
+            self.beginInsertRows(QModelIndex(), first, first + len(books) - 1)
+            self.books.extend(books)
+            self.endInsertRows()
+    
+    def on_page_error(self, message):
+        self.loading_changed.emit(False)
+    
+    def update_book(self, book):
+        """Заменяет загруженную книгу новыми данными. Возвращает False, если книги нет в списке"""
+        for row, loaded in enumerate(self.books):
+            if loaded[0] == book[0]:
+                self.books[row] = book
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+                return True
+        return False
+    
+    def remove_book(self, book_id):
+        for row, loaded in enumerate(self.books):
+            if loaded[0] == book_id:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.books[row]
+                self.endRemoveRows()
+                return True
+        return False
+
+class CoverCache:
+    """Общий для процесса кэш уменьшенных обложек.
+    
+    Ключ — имя файла и размер, объем ограничен в байтах: при переполнении
+    вытесняются давно не использованные обложки.
+    """
+    
+    IMAGE_DIR = "Модуль 1/Прил_2_ОЗ_КОД 09.02.07-2-2026-М1"
+    PLACEHOLDER = 'placeboholder.png'
+    
+    def __init__(self, max_bytes=16 * 1024 * 1024, thumbnails=None):
+        self.max_bytes = max_bytes
+        self.thumbnails = thumbnails
+        self.pixmaps = OrderedDict()  # (файл, ширина, высота) -> (pixmap, байты)
+        self.total_bytes = 0
+        self.metrics = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    @staticmethod
+    def pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+    
+    def cache_key(self, image_filename, width, height):
+        return (image_filename or self.PLACEHOLDER, width, height)
+    
+    def load_image(self, image_filename, width, height):
+        """Читает обложку с диска и уменьшает ее до нужного размера.
         
-        # Выделяем книги без остатка
-        if self.book_data[7] == 0:  # stock_quantity
-            self.setStyleSheet("""
-                QFrame {
-                    background-color: #ADD8E6;
-                    border: 2px solid #74b9ff;
-                    border-radius: 8px;
-                    margin: 8px;
-                }
-            """)
+        Работает с QImage, поэтому может выполняться в фоновом потоке.
+        """
+        # Сначала пробуем готовую миниатюру, чтобы не разбирать полноразмерный файл
+        if self.thumbnails is not None:
+            try:
+                thumbnail_path = self.thumbnails.get(image_filename, width, height)
+            except OSError:
+                thumbnail_path = None
+            if thumbnail_path:
+                image = QImage(thumbnail_path)
+                if not image.isNull():
+                    return image
+        
+        image = QImage(os.path.join(self.IMAGE_DIR, image_filename))
+        if image.isNull():
+            return image
+        return image.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    
+    def peek(self, image_filename, width, height):
+        """Возвращает обложку из кэша без загрузки с диска или None.
+        
+        Промах считается в store, когда обложка действительно загружена.
+        """
+        key = self.cache_key(image_filename, width, height)
+        entry = self.pixmaps.get(key)
+        if entry is None:
+            return None
+        self.metrics['hits'] += 1
+        self.pixmaps.move_to_end(key)
+        return entry[0]
+    
+    def store(self, key, image):
+        """Кладет загруженную обложку в кэш, при отсутствии файла — заглушку"""
+        self.metrics['misses'] += 1
+        pixmap = QPixmap.fromImage(image)
+        if pixmap.isNull() and key[0] != self.PLACEHOLDER:
+            # Если изображение не найдено, используем placeholder (он тоже попадет в кэш)
+            pixmap = self.get(self.PLACEHOLDER, key[1], key[2])
+        self.put(key, pixmap)
+        return pixmap
+    
+    def get(self, image_filename, width, height):
+        """Возвращает обложку нужного размера, при отсутствии файла — заглушку"""
+        pixmap = self.peek(image_filename, width, height)
+        if pixmap is None:
+            key = self.cache_key(image_filename, width, height)
+            pixmap = self.store(key, self.load_image(*key))
+        return pixmap
+    
+    def put(self, key, pixmap):
+        size = self.pixmap_bytes(pixmap)
+        old = self.pixmaps.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        self.pixmaps[key] = (pixmap, size)
+        self.total_bytes += size
+        
+        # Вытесняем самые старые обложки, пока не уложимся в бюджет
+        while self.total_bytes > self.max_bytes and len(self.pixmaps) > 1:
+            _, (_, evicted) = self.pixmaps.popitem(last=False)
+            self.total_bytes -= evicted
+            self.metrics['evictions'] += 1
+    
+    def clear(self):
+        self.pixmaps.clear()
+        self.total_bytes = 0
+    
+    def stats(self):
+        """Возвращает метрики кэша"""
+        stats = dict(self.metrics)
+        stats['entries'] = len(self.pixmaps)
+        stats['bytes'] = self.total_bytes
+        stats['max_bytes'] = self.max_bytes
+        requests = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / requests if requests else 0.0
+        return stats
+
+# Обложки разбираются один раз за сеанс и используются всеми виджетами
+cover_cache = CoverCache(thumbnails=thumbnail_store)
+
+class CoverTaskSignals(QObject):
+    """Сигналы фоновой загрузки обложки"""
+    
+    finished = pyqtSignal(object, object)  # ключ кэша, QImage
+
+class CoverTask(QRunnable):
+    """Загрузка и уменьшение одной обложки в фоновом потоке"""
+    
+    def __init__(self, key, covers, priority):
+        super().__init__()
+        self.key = key
+        self.covers = covers
+        self.priority = priority
+        self.signals = CoverTaskSignals()
+        self.setAutoDelete(False)
+    
+    def run(self):
+        self.signals.finished.emit(self.key, self.covers.load_image(*self.key))
+
+class CoverLoader(QObject):
+    """Фоновая загрузка обложек для карточек каталога.
+    
+    Обложки видимых карточек загружаются в первую очередь, запросы для
+    карточек, ушедших из области просмотра, снимаются с очереди.
+    """
+    
+    VISIBLE_PRIORITY = 1
+    PREFETCH_PRIORITY = 0
+    
+    cover_ready = pyqtSignal(object)
+    
+    def __init__(self, covers=None, parent=None, max_threads=2):
+        super().__init__(parent)
+        self.covers = covers or cover_cache
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.pending = {}  # ключ кэша -> задача
+    
+    def request(self, image_filename, width, height, priority=VISIBLE_PRIORITY):
+        """Ставит обложку в очередь загрузки, если ее еще нет в кэше"""
+        key = self.covers.cache_key(image_filename, width, height)
+        task = self.pending.get(key)
+        if task is not None:
+            # Повышаем приоритет, если задача еще не начала выполняться
+            if priority > task.priority and self.pool.tryTake(task):
+                task.priority = priority
+                self.pool.start(task, priority)
+            return
+        if key in self.covers.pixmaps:
+            return
         
+        task = CoverTask(key, self.covers, priority)
+        task.signals.finished.connect(self.on_finished)
+        self.pending[key] = task
+        self.pool.start(task, priority)
+    
+    def retain(self, keys):
+        """Отменяет ожидающие загрузки, кроме перечисленных"""
+        for key, task in list(self.pending.items()):
+            if key not in keys and self.pool.tryTake(task):
+                del self.pending[key]
+    
+    def on_finished(self, key, image):
+        self.pending.pop(key, None)
+        self.covers.store(key, image)
+        self.cover_ready.emit(key)
+
+class BookCardDelegate(QStyledItemDelegate):
+    """Отрисовка карточки книги в сетке каталога"""
+    
+    CARD_WIDTH = 270
+    CARD_HEIGHT = 370
+    MARGIN = 8
+    PADDING = 15
+    COVER_WIDTH = 120
+    COVER_HEIGHT = 160
+    
+    def __init__(self, parent=None, covers=None, loader=None):
+        super().__init__(parent)
+        self.covers = covers or cover_cache
+        self.loader = loader
+    
+    def sizeHint(self, option, index):
+        return QSize(self.CARD_WIDTH, self.CARD_HEIGHT)
+    
+    def cover_size(self):
+        return self.COVER_WIDTH - 4, self.COVER_HEIGHT - 4
+    
+    def cover_pixmap(self, image_filename):
+        """Возвращает уменьшенную обложку книги или заглушку"""
+        width, height = self.cover_size()
+        if self.loader is None:
+            return self.covers.get(image_filename, width, height)
+        
+        # Пока обложка загружается в фоне, показываем заглушку
+        pixmap = self.covers.peek(image_filename, width, height)
+        if pixmap is None:
+            self.loader.request(image_filename, width, height)
+            pixmap = self.covers.get(CoverCache.PLACEHOLDER, width, height)
+        return pixmap
+    
+    def card_colors(self, book, option):
+        """Цвета фона и рамки карточки"""
         # Выделяем книги в акции
-        if self.book_data[8] and self.book_data[9]:  # is_on_sale and discount_price
-            self.setStyleSheet("""
-                QFrame {
-                    background-color: #FFE4B5;
-                    border: 2px solid #FF8C00;
-                    border-radius: 8px;
-                    margin: 8px;
-                }
-            """)
+        if book[8] and book[9]:  # is_on_sale and discount_price
+            return '#FFE4B5', '#FF8C00'
+        # Выделяем книги без остатка
+        if book[7] == 0:  # stock_quantity
+            return '#ADD8E6', '#74b9ff'
+        if option.state & QStyle.State_MouseOver:
+            return '#FFFFFF', '#00FA9A'
+        return '#FFFFFF', '#7FFF00'
+    
+    def text_font(self, option, pixel_size, bold=False):
+        font = QFont(option.font)
+        font.setPixelSize(pixel_size)
+        font.setBold(bold)
+        return font
+    
+    def paint(self, painter, option, index):
+        book = index.data(BookListModel.BookRole)
+        if book is None:
+            return
         
-        layout = QVBoxLayout()
-        layout.setSpacing(10)
-        layout.setContentsMargins(15, 15, 15, 15)
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setClipRect(option.rect)
         
-        # Обложка книги
-        cover_label = QLabel()
-        cover_label.setFixedSize(120, 160)
-        cover_label.setStyleSheet("""
-            QLabel {
-                background-color: #FFFFFF;
-                border: 2px solid #7FFF00;
-                border-radius: 8px;
-            }
-        """)
-        cover_label.setAlignment(Qt.AlignCenter)
-        cover_label.setScaledContents(True)
+        # Рамка карточки
+        card = option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        background, border = self.card_colors(book, option)
+        painter.setPen(QPen(QColor(border), 2))
+        painter.setBrush(QColor(background))
+        painter.drawRoundedRect(card, 8, 8)
         
-        # Загружаем изображение книги
-        image_filename = self.book_data[10] if self.book_data[10] else 'placeholder.png'
-        image_path = f"Модуль 1/Прил_2_ОЗ_КОД 09.02.07-2-2026-М1/{image_filename}"
+        content = card.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+        left, width = content.left(), content.width()
         
-        try:
-            pixmap = QPixmap(image_path)
-            if not pixmap.isNull():
-                cover_label.setPixmap(pixmap.scaled(116, 156, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-            else:
-                # Если изображение не найдено, используем placeholder
-                placeholder_path = "Модуль 1/Прил_2_ОЗ_КОД 09.02.07-2-2026-М1/placeboholder.png"
-                placeholder_pixmap = QPixmap(placeholder_path)
-                if not placeholder_pixmap.isNull():
-                    cover_label.setPixmap(placeholder_pixmap.scaled(116, 156, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-                else:
-                    cover_label.setText("📖")
-                    cover_label.setStyleSheet("font-size: 48px;")
-        except:
-            # В случае ошибки используем placeholder
-            try:
-                placeholder_path = "Модуль 1/Прил_2_ОЗ_КОД 09.02.07-2-2026-М1/placeboholder.png"
-                placeholder_pixmap = QPixmap(placeholder_path)
-                if not placeholder_pixmap.isNull():
-                    cover_label.setPixmap(placeholder_pixmap.scaled(116, 156, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-                else:
-                    cover_label.setText("📖")
-                    cover_label.setStyleSheet("font-size: 48px;")
-            except:
-                cover_label.setText("📖")
-                cover_label.setStyleSheet("font-size: 48px;")
-        
-        layout.addWidget(cover_label)
-        
-        # Информация о книге
-        title_author = f"{self.book_data[1]} | {self.book_data[2]}"
-        title_label = QLabel(title_author)
-        title_label.setWordWrap(True)
-        title_label.setStyleSheet("font-weight: bold; font-size: 14px; color: #333;")
-        layout.addWidget(title_label)
+        # Обложка книги
+        cover_rect = QRect(left, content.top(), self.COVER_WIDTH, self.COVER_HEIGHT)
+        painter.setPen(QPen(QColor('#7FFF00'), 2))
+        painter.setBrush(QColor('#FFFFFF'))
+        painter.drawRoundedRect(cover_rect, 8, 8)
+        pixmap = self.cover_pixmap(book[10])
+        if not pixmap.isNull():
+            x = cover_rect.left() + (cover_rect.width() - pixmap.width()) // 2
+            y = cover_rect.top() + (cover_rect.height() - pixmap.height()) // 2
+            painter.drawPixmap(x, y, pixmap)
+        else:
+            painter.setFont(self.text_font(option, 48))
+            painter.drawText(cover_rect, Qt.AlignCenter, "📖")
+        y = cover_rect.bottom() + 10
+        
+        # Название и автор (не более двух строк)
+        font = self.text_font(option, 14, bold=True)
+        painter.setFont(font)
+        painter.setPen(QColor('#333'))
+        title_rect = QRect(left, y, width, QFontMetrics(font).lineSpacing() * 2)
+        painter.drawText(title_rect, Qt.AlignLeft | Qt.AlignTop | Qt.TextWordWrap, f"{book[1]} | {book[2]}")
+        y = title_rect.bottom() + 10
         
         # Детали
-        details = [
-            f"Жанр: {self.book_data[3]}",
-            f"Издательство: {self.book_data[4]}",
-            f"Год: {self.book_data[5]}",
-        ]
-        
-        for detail in details:
-            detail_label = QLabel(detail)
-            detail_label.setStyleSheet("font-size: 12px; color: #666;")
-            layout.addWidget(detail_label)
+        font = self.text_font(option, 12)
+        line_height = QFontMetrics(font).height()
+        painter.setFont(font)
+        painter.setPen(QColor('#666'))
+        for detail in (f"Жанр: {book[3]}", f"Издательство: {book[4]}", f"Год: {book[5]}"):
+            detail = QFontMetrics(font).elidedText(detail, Qt.ElideRight, width)
+            painter.drawText(QRect(left, y, width, line_height), Qt.AlignLeft | Qt.AlignVCenter, detail)
+            y += line_height + 10
         
         # Цена
-        price_layout = QHBoxLayout()
-        
-        if self.book_data[8]:  # is_on_sale
-            # Акционная цена
-            old_price = QLabel(f"₽{self.book_data[6]:.0f}")
-            old_price.setStyleSheet("text-decoration: line-through; color: red; font-size: 12px;")
-            price_layout.addWidget(old_price)
-            
-            new_price = QLabel(f"₽{self.book_data[9]:.0f}")
-            new_price.setStyleSheet("font-weight: bold; font-size: 16px; color: #333;")
-            price_layout.addWidget(new_price)
+        price_font = self.text_font(option, 16, bold=True)
+        price_height = QFontMetrics(price_font).height()
+        x = left
+        if book[8] and book[9] is not None:  # is_on_sale
+            # Старая цена зачеркнута, рядом акционная
+            old_font = self.text_font(option, 12)
+            old_font.setStrikeOut(True)
+            old_price = f"₽{book[6]:.0f}"
+            painter.setFont(old_font)
+            painter.setPen(QColor('red'))
+            painter.drawText(QRect(x, y, width, price_height), Qt.AlignLeft | Qt.AlignVCenter, old_price)
+            x += QFontMetrics(old_font).horizontalAdvance(old_price) + 10
+            price = f"₽{book[9]:.0f}"
         else:
-            price = QLabel(f"₽{self.book_data[6]:.0f}")
-            price.setStyleSheet("font-weight: bold; font-size: 16px; color: #333;")
-            price_layout.addWidget(price)
-        
-        layout.addLayout(price_layout)
+            price = f"₽{book[6]:.0f}"
+        painter.setFont(price_font)
+        painter.setPen(QColor('#333'))
+        painter.drawText(QRect(x, y, left + width - x, price_height), Qt.AlignLeft | Qt.AlignVCenter, price)
+        y += price_height + 10
         
         # Количество на складе
-        stock_label = QLabel(f"На складе: {self.book_data[7]} шт.")
-        if self.book_data[7] == 0:
-            stock_label.setStyleSheet("color: red; font-weight: bold;")
-        else:
-            stock_label.setStyleSheet("color: #666;")
-        layout.addWidget(stock_label)
+        stock_font = self.text_font(option, 12, bold=book[7] == 0)
+        painter.setFont(stock_font)
+        painter.setPen(QColor('red') if book[7] == 0 else QColor('#666'))
+        painter.drawText(QRect(left, y, width, QFontMetrics(stock_font).height()),
+                         Qt.AlignLeft | Qt.AlignVCenter, f"На складе: {book[7]} шт.")
         
-        self.setLayout(layout)
+        painter.restore()
 
 class CatalogWidget(QWidget):
     """Виджет каталога книг"""
     
-    def __init__(self, db_manager, user_role, parent=None):
+    PAGE_SIZE = 40  # Количество книг, загружаемых за один раз
+    SEARCH_DELAY_MS = 300  # Пауза после ввода, по истечении которой выполняется поиск
+    
+    def __init__(self, db_manager, user_role, parent=None, search_delay=None):
         super().__init__(parent)
         self.db_manager = db_manager
         self.user_role = user_role
+        self.search_delay = self.SEARCH_DELAY_MS if search_delay is None else search_delay
+        self.current_params = None  # Параметры, с которыми загружен каталог
+        
+        # Таймер объединяет серию изменений фильтров в один запрос
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.timeout.connect(self.apply_filters)
+        
+        # Обложки загружаются в фоне, очередь пересматривается после прокрутки
+        self.cover_loader = CoverLoader(cover_cache, self)
+        self.cover_timer = QTimer(self)
+        self.cover_timer.setSingleShot(True)
+        self.cover_timer.setInterval(50)
+        self.cover_timer.timeout.connect(self.update_cover_requests)
+        
+        self.db_manager.changes.subscribe(ChangeEvent.BOOK, self.on_books_changed)
         self.init_ui()
     
     def init_ui(self):
@@ -1055,7 +1871,7 @@ class CatalogWidget(QWidget):
             # Поиск (для всех ролей)
             self.search_input = QLineEdit()
             self.search_input.setPlaceholderText('Поиск по названию или автору...')
-            self.search_input.textChanged.connect(self.apply_filters)
+            self.search_input.textChanged.connect(self.on_search_changed)
             filter_layout.addWidget(self.search_input)
             
             # Фильтр по жанру (только для менеджера и администратора)
@@ -1065,58 +1881,53 @@ class CatalogWidget(QWidget):
                 genres = self.db_manager.get_genres()
                 for genre in genres:
                     self.genre_combo.addItem(genre[1])
-                self.genre_combo.currentTextChanged.connect(self.apply_filters)
+                self.genre_combo.currentTextChanged.connect(self.on_filter_changed)
                 filter_layout.addWidget(self.genre_combo)
                 
                 # Сортировка (только для менеджера и администратора)
                 self.sort_combo = QComboBox()
                 self.sort_combo.addItems(['По названию', 'По автору', 'По цене', 'По году'])
-                self.sort_combo.currentTextChanged.connect(self.apply_filters)
+                self.sort_combo.currentTextChanged.connect(self.on_filter_changed)
                 filter_layout.addWidget(self.sort_combo)
             
             filter_frame.setLayout(filter_layout)
             layout.addWidget(filter_frame)
         
-        # Область прокрутки для книг
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setStyleSheet("""
-            QScrollArea {
+        # Сетка карточек: рисуются только видимые книги, страницы подгружаются при прокрутке
+        self.books_model = BookListModel(self.db_manager, self.PAGE_SIZE, self)
+        self.books_view = QListView()
+        self.books_view.setViewMode(QListView.IconMode)
+        self.books_view.setResizeMode(QListView.Adjust)
+        self.books_view.setMovement(QListView.Static)
+        self.books_view.setUniformItemSizes(True)
+        self.books_view.setSelectionMode(QAbstractItemView.NoSelection)
+        self.books_view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.books_view.setMouseTracking(True)
+        self.books_delegate = BookCardDelegate(self.books_view, loader=self.cover_loader)
+        self.books_view.setItemDelegate(self.books_delegate)
+        self.books_view.setModel(self.books_model)
+        self.books_model.loading_changed.connect(self.on_loading_changed)
+        self.books_model.modelReset.connect(self.cover_timer.start)
+        self.books_model.rowsInserted.connect(self.cover_timer.start)
+        self.books_view.verticalScrollBar().valueChanged.connect(self.cover_timer.start)
+        self.cover_loader.cover_ready.connect(self.books_view.viewport().update)
+        self.books_view.setStyleSheet("""
+            QListView {
                 border: none;
                 background-color: #FFFFFF;
             }
         """)
-        
-        # Контейнер для карточек книг
-        self.books_widget = QWidget()
-        self.books_layout = QGridLayout()
-        self.books_layout.setSpacing(15)
-        self.books_widget.setLayout(self.books_layout)
-        
-        scroll_area.setWidget(self.books_widget)
-        layout.addWidget(scroll_area)
+        self.loading_label = create_loading_label()
+        layout.addWidget(self.loading_label)
+        layout.addWidget(self.books_view)
         
         self.setLayout(layout)
         
         # Загружаем книги
         self.load_books()
     
-    def load_books(self):
-        """Загружает книги в каталог"""
-        # УДАЛЯЕМ ВСЕ ВИДЖЕТЫ ИЗ LAYOUT
-        while self.books_layout.count() > 0:
-            item = self.books_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-            elif item.layout():
-                # Рекурсивно удаляем все элементы из вложенного layout
-                while item.layout().count() > 0:
-                    child_item = item.layout().takeAt(0)
-                    if child_item.widget():
-                        child_item.widget().deleteLater()
-                item.layout().deleteLater()
-        
-        # Получаем параметры фильтрации
+    def filter_params(self):
+        """Возвращает текущие параметры каталога: (сортировка, фильтры)"""
         search_query = None
         genre_filter = None
         sort_by = 'title'
@@ -1135,35 +1946,379 @@ class CatalogWidget(QWidget):
                 'По году': 'year'
             }
             sort_by = sort_mapping.get(self.sort_combo.currentText(), 'title')
+        elif search_query:
+            # Без выбора сортировки результаты поиска показываем по релевантности
+            sort_by = 'relevance'
         
-        # Получаем книги из базы данных (дубликаты уже убраны в get_books)
-        books = self.db_manager.get_books(search_query, genre_filter, sort_by)
-        
-        print(f"Загружено {len(books)} уникальных книг")
+        return sort_by, {'search': search_query, 'genre': genre_filter}
+    
+    def load_books(self):
+        """Загружает первую страницу книг в каталог"""
+        # Отложенное применение фильтров больше не нужно - загружаем сразу
+        self.filter_timer.stop()
         
-        # ДОПОЛНИТЕЛЬНАЯ ПРОВЕРКА - очищаем layout еще раз
-        while self.books_layout.count() > 0:
-            item = self.books_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
+        sort_by, filters = self.filter_params()
+        self.current_params = (sort_by, filters)
         
-        # Создаем карточки книг
-        row, col = 0, 0
-        max_cols = 4
+        # Запрашиваем первую страницу книг (дубликаты уже убраны в запросе)
+        self.books_model.reset_books(sort_by, filters)
+    
+    def on_books_changed(self, event):
+        """Обновляет только карточки измененных книг.
         
-        for book in books:
-            book_card = BookCard(book)
-            self.books_layout.addWidget(book_card, row, col)
-            
-            col += 1
-            if col >= max_cols:
-                col = 0
-                row += 1
+        Новая книга может попасть в любое место сортировки, поэтому для нее
+        (и после массовых изменений) перезапрашивается первая страница.
+        """
+        if event.ids is None or event.action == ChangeEvent.INSERTED:
+            self.load_books()
+            return
+        for book_id in event.ids:
+            book = None if event.action == ChangeEvent.DELETED else self.db_manager.get_book_row(book_id)
+            if book is None:
+                self.books_model.remove_book(book_id)
+            else:
+                self.books_model.update_book(book)
+    
+    def update_cover_requests(self):
+        """Загружает обложки видимых карточек первыми, следующий экран — заранее.
+        
+        Запросы для карточек вне этих областей отменяются.
+        """
+        width, height = self.books_delegate.cover_size()
+        viewport = self.books_view.viewport().rect()
+        next_screen = viewport.translated(0, viewport.height())
+        visible, prefetch = [], []
+        
+        # Перебираем только карточки от левого верхнего угла до конца следующего экрана,
+        # чтобы стоимость не росла с числом загруженных страниц
+        first = self.books_view.indexAt(QPoint(1, 1))
+        for row in range(first.row() if first.isValid() else 0, self.books_model.rowCount()):
+            index = self.books_model.index(row)
+            rect = self.books_view.visualRect(index)
+            if rect.top() > next_screen.bottom():
+                break
+            if rect.intersects(viewport):
+                visible.append(index.data(BookListModel.BookRole)[10])
+            elif rect.intersects(next_screen):
+                prefetch.append(index.data(BookListModel.BookRole)[10])
+        
+        keys = {cover_cache.cache_key(name, width, height) for name in visible + prefetch}
+        self.cover_loader.retain(keys)
+        for name in visible:
+            self.cover_loader.request(name, width, height, CoverLoader.VISIBLE_PRIORITY)
+        for name in prefetch:
+            self.cover_loader.request(name, width, height, CoverLoader.PREFETCH_PRIORITY)
+    
+    def on_loading_changed(self, loading):
+        """Показывает надпись о загрузке, пока запрос каталога выполняется"""
+        self.loading_label.setVisible(loading)
+        if not loading:
+            print(f"Загружено {self.books_model.rowCount()} уникальных книг")
+    
+    def on_search_changed(self):
+        """Откладывает поиск, пока пользователь продолжает ввод"""
+        self.filter_timer.start(self.search_delay)
+    
+    def on_filter_changed(self):
+        """Применяет жанр и сортировку в ближайшем цикле событий.
+        
+        Несколько изменений подряд (и незавершенный ввод в поиске) дают один запрос.
+        """
+        self.filter_timer.start(0)
     
     def apply_filters(self):
-        """Применяет фильтры и перезагружает книги"""
+        """Применяет фильтры и перезагружает книги, если они действительно изменились"""
+        if self.filter_params() == self.current_params:
+            return
         self.load_books()
 
+class RecordTableModel(QAbstractTableModel):
+    """Модель таблицы записей (кортежей), первый элемент записи - ее id.
+    
+    При обновлении списка изменившиеся строки сообщаются через dataChanged,
+    а модель сбрасывается, только если порядок записей стал другим.
+    Отдельные записи добавляются, обновляются и удаляются по одной строке.
+    """
+    
+    HEADERS = []
+    FIELDS = []  # Индекс поля записи для каждого столбца, None - столбец кнопок
+    
+    RecordRole = Qt.UserRole + 1
+    SortRole = Qt.UserRole + 2
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.records = []
+        self.rows = {}  # id записи -> номер строки
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.records)
+    
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+    
+    def display_value(self, record, column):
+        value = record[self.FIELDS[column]]
+        return '' if value is None else str(value)
+    
+    def sort_value(self, record, column):
+        value = record[self.FIELDS[column]]
+        if isinstance(value, (int, float)):
+            return value
+        return '' if value is None else str(value)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.records):
+            return None
+        record = self.records[index.row()]
+        if role == self.RecordRole:
+            return record
+        if self.FIELDS[index.column()] is None:
+            return None
+        if role == Qt.DisplayRole:
+            return self.display_value(record, index.column())
+        if role == self.SortRole:
+            return self.sort_value(record, index.column())
+        return None
+    
+    def record_key(self, record):
+        return str(record[0])
+    
+    def insert_position(self, record):
+        """Строка для новой записи (по умолчанию в начало списка)"""
+        return 0
+    
+    def rebuild_rows(self):
+        self.rows = {self.record_key(record): row for row, record in enumerate(self.records)}
+    
+    def emit_row_changed(self, row):
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+    
+    def set_records(self, records):
+        """Обновляет список записей, сообщая только об изменившихся строках"""
+        records = list(records)
+        old_keys = [self.record_key(record) for record in self.records]
+        new_keys = [self.record_key(record) for record in records]
+        
+        if old_keys != new_keys:
+            new_set = set(new_keys)
+            kept = [key for key in old_keys if key in new_set]
+            old_set = set(old_keys)
+            if kept != [key for key in new_keys if key in old_set]:
+                # Порядок записей изменился - проще перестроить модель
+                self.beginResetModel()
+                self.records = records
+                self.rebuild_rows()
+                self.endResetModel()
+                return
+            
+            # Удаляем пропавшие записи снизу вверх, затем вставляем новые по местам
+            for row in range(len(old_keys) - 1, -1, -1):
+                if old_keys[row] not in new_set:
+                    self.beginRemoveRows(QModelIndex(), row, row)
+                    del self.records[row]
+                    self.endRemoveRows()
+            for row, key in enumerate(new_keys):
+                if key not in old_set:
+                    self.beginInsertRows(QModelIndex(), row, row)
+                    self.records.insert(row, records[row])
+                    self.endInsertRows()
+            self.rebuild_rows()
+        
+        for row, record in enumerate(records):
+            if self.records[row] != record:
+                self.records[row] = record
+                self.emit_row_changed(row)
+    
+    def update_record(self, record):
+        """Обновляет одну строку или добавляет новую запись"""
+        row = self.rows.get(self.record_key(record))
+        if row is None:
+            row = self.insert_position(record)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.records.insert(row, record)
+            self.rebuild_rows()
+            self.endInsertRows()
+            return
+        if self.records[row] != record:
+            self.records[row] = record
+            self.emit_row_changed(row)
+    
+    def remove_record(self, record_id):
+        row = self.rows.get(str(record_id))
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.records[row]
+        self.rebuild_rows()
+        self.endRemoveRows()
+
+class OrderTableModel(RecordTableModel):
+    """Модель таблицы заказов (записи в формате DatabaseManager.get_orders)"""
+    
+    HEADERS = ['Номер заказа', 'Состав заказа', 'Дата заказа', 'Дата доставки',
+               'ID Пункта выдачи', 'ФИО клиента', 'Код для получения', 'Статус заказа', 'Действия']
+    FIELDS = [0, 1, 2, 3, 4, 5, 6, 7, None]
+    ACTION_COLUMN = 8
+    DATE_COLUMNS = (2, 3)
+    
+    def sort_value(self, record, column):
+        value = record[self.FIELDS[column]]
+        if column in self.DATE_COLUMNS and value:
+            # 'дд.мм.гггг' -> 'гггг.мм.дд', чтобы даты сортировались по порядку
+            return '.'.join(reversed(str(value).split('.')))
+        return super().sort_value(record, column)
+
+class BookTableModel(RecordTableModel):
+    """Модель таблицы книг панели администратора (записи в формате get_books)"""
+    
+    HEADERS = ['ID', 'Название', 'Автор', 'Жанр', 'Издательство', 'Цена', 'Количество', 'Действия']
+    FIELDS = [0, 1, 2, 3, 4, 6, 7, None]
+    ACTION_COLUMN = 7
+    PRICE_COLUMN = 5
+    
+    def display_value(self, record, column):
+        if column == self.PRICE_COLUMN:
+            try:
+                return f"₽{float(record[6]):.2f}"
+            except (ValueError, TypeError):
+                pass
+        return super().display_value(record, column)
+    
+    def insert_position(self, record):
+        # get_books по умолчанию сортирует по названию
+        return next((row for row, book in enumerate(self.records) if book[1] > record[1]),
+                    len(self.records))
+
+class UserTableModel(RecordTableModel):
+    """Модель таблицы пользователей (записи в формате get_users)"""
+    
+    HEADERS = ['ID', 'Логин', 'ФИО', 'Роль', 'Действия']
+    FIELDS = [0, 1, 2, 3, None]
+    ACTION_COLUMN = 4
+    
+    def insert_position(self, record):
+        # get_users сортирует по роли и ФИО
+        key = (record[3], record[2])
+        return next((row for row, user in enumerate(self.records) if (user[3], user[2]) > key),
+                    len(self.records))
+
+class ActionButtonsDelegate(QStyledItemDelegate):
+    """Рисует кнопки действий в ячейке таблицы без отдельных виджетов на строку.
+    
+    buttons - список (действие, текст, цвет фона, цвет при наведении, цвет текста).
+    При нажатии испускается clicked(действие, id записи).
+    """
+    
+    clicked = pyqtSignal(str, object)
+    
+    BUTTON_HEIGHT = 22
+    SPACING = 6
+    
+    def __init__(self, buttons, button_width=70, parent=None):
+        super().__init__(parent)
+        self.buttons = buttons
+        self.button_width = button_width
+        self.view = None
+        self.hover_pos = None  # Положение курсора над таблицей
+    
+    def button_rects(self, rect):
+        width = min(self.button_width, (rect.width() - 4) // len(self.buttons))
+        height = min(self.BUTTON_HEIGHT, rect.height() - 4)
+        total = width * len(self.buttons) + self.SPACING * (len(self.buttons) - 1)
+        left = rect.left() + max(0, (rect.width() - total) // 2)
+        top = rect.top() + (rect.height() - height) // 2
+        return [QRect(left + i * (width + self.SPACING), top, width, height)
+                for i in range(len(self.buttons))]
+    
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        
+        font = QFont(option.font)
+        font.setPointSize(8)
+        font.setBold(True)
+        painter.setFont(font)
+        
+        for rect, (action, text, color, hover_color, text_color) in zip(self.button_rects(option.rect), self.buttons):
+            hovered = self.hover_pos is not None and rect.contains(self.hover_pos)
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor(hover_color if hovered else color))
+            painter.drawRoundedRect(rect, 3, 3)
+            painter.setPen(QColor(text_color))
+            painter.drawText(rect, Qt.AlignCenter, text)
+        painter.restore()
+    
+    def sizeHint(self, option, index):
+        width = (self.button_width + self.SPACING) * len(self.buttons) + 4
+        return QSize(width, self.BUTTON_HEIGHT + 8)
+    
+    def watch_hover(self, view):
+        """Подсвечивает кнопку под курсором (отслеживает движение мыши над таблицей)"""
+        self.view = view
+        view.setMouseTracking(True)
+        view.viewport().installEventFilter(self)
+    
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.MouseMove, QEvent.Leave):
+            old_index = self.view.indexAt(self.hover_pos) if self.hover_pos is not None else None
+            self.hover_pos = event.pos() if event.type() == QEvent.MouseMove else None
+            new_index = self.view.indexAt(self.hover_pos) if self.hover_pos is not None else None
+            # Перерисовываем только ячейки с кнопками под курсором
+            for index in (old_index, new_index):
+                if index is not None and index.isValid() and self.view.itemDelegateForColumn(index.column()) is self:
+                    self.view.viewport().update(self.view.visualRect(index))
+        return False
+    
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            for rect, button in zip(self.button_rects(option.rect), self.buttons):
+                if rect.contains(event.pos()):
+                    record = index.data(RecordTableModel.RecordRole)
+                    if record is not None:
+                        self.clicked.emit(button[0], record[0])
+                    return True
+        return super().editorEvent(event, model, option, index)
+
+def create_records_table(model, delegate=None):
+    """Создает таблицу для модели записей с кнопками действий в последнем столбце"""
+    table = QTableView()
+    table.setModel(model)
+    table.setSelectionBehavior(QAbstractItemView.SelectRows)
+    table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+    table.verticalHeader().setDefaultSectionSize(32)
+    table.horizontalHeader().setStretchLastSection(True)
+    if delegate is not None:
+        source = model.sourceModel() if isinstance(model, QSortFilterProxyModel) else model
+        delegate.setParent(table)
+        table.setItemDelegateForColumn(source.ACTION_COLUMN, delegate)
+        delegate.watch_hover(table)
+    table.setStyleSheet("""
+        QTableView {
+            background-color: #FFFFFF;
+            border: 2px solid #7FFF00;
+            border-radius: 8px;
+            gridline-color: #7FFF00;
+        }
+        QHeaderView::section {
+            background-color: #7FFF00;
+            color: #333;
+            font-weight: bold;
+            padding: 8px;
+        }
+    """)
+    return table
+
 class OrdersWidget(QWidget):
     """Виджет заказов для менеджера и администратора"""
     
@@ -1171,6 +2326,8 @@ class OrdersWidget(QWidget):
         super().__init__(parent)
         self.db_manager = db_manager
         self.user_role = user_role
+        self.query_runner = AsyncQueryRunner(self)
+        self.db_manager.changes.subscribe(ChangeEvent.ORDER, self.on_orders_changed)
         self.init_ui()
     
     def init_ui(self):
@@ -1219,31 +2376,36 @@ class OrdersWidget(QWidget):
         
         layout.addLayout(header_layout)
         
-        # Таблица заказов
-        self.orders_table = QTableWidget()
-        self.orders_table.setColumnCount(9)
-        self.orders_table.setHorizontalHeaderLabels([
-            'Номер заказа', 'Состав заказа', 'Дата заказа', 'Дата доставки', 
-            'ID Пункта выдачи', 'ФИО клиента', 'Код для получения', 'Статус заказа', 'Действия'
-        ])
-        self.orders_table.setStyleSheet("""
-            QTableWidget {
-                background-color: #FFFFFF;
-                border: 2px solid #7FFF00;
-                border-radius: 8px;
-                gridline-color: #7FFF00;
-            }
-            QHeaderView::section {
-                background-color: #7FFF00;
-                color: #333;
-                font-weight: bold;
-                padding: 8px;
-            }
-            QTableWidgetItem {
+        # Поиск по заказам (фильтрация без обращения к базе)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText('Поиск по заказам...')
+        self.search_input.setStyleSheet("""
+            QLineEdit {
                 padding: 8px;
+                border: 2px solid #7FFF00;
+                border-radius: 4px;
+                background-color: #FFFFFF;
             }
         """)
-        
+        layout.addWidget(self.search_input)
+        
+        # Таблица заказов: модель, прокси для сортировки и поиска, кнопки рисует делегат
+        self.orders_model = OrderTableModel(self)
+        self.orders_proxy = QSortFilterProxyModel(self)
+        self.orders_proxy.setSourceModel(self.orders_model)
+        self.orders_proxy.setSortRole(OrderTableModel.SortRole)
+        self.orders_proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.orders_proxy.setFilterKeyColumn(-1)
+        self.search_input.textChanged.connect(self.orders_proxy.setFilterFixedString)
+        
+        self.details_delegate = ActionButtonsDelegate([('details', 'Детали', '#00FA9A', '#7FFF00', '#333')])
+        self.details_delegate.clicked.connect(lambda action, order_id: self.show_order_details(order_id))
+        self.orders_table = create_records_table(self.orders_proxy, self.details_delegate)
+        self.orders_table.setSortingEnabled(True)
+        self.orders_table.sortByColumn(-1, Qt.AscendingOrder)  # Исходный порядок до выбора столбца
+        
+        self.loading_label = create_loading_label('Загрузка заказов...')
+        layout.addWidget(self.loading_label)
         layout.addWidget(self.orders_table)
         
         self.setLayout(layout)
@@ -1252,81 +2414,48 @@ class OrdersWidget(QWidget):
         self.load_orders()
     
     def load_orders(self):
-        """Загружает заказы в таблицу"""
-        orders = self.db_manager.get_orders()
-        
-        # Очищаем таблицу перед загрузкой
-        self.orders_table.setRowCount(0)
-        self.orders_table.setRowCount(len(orders))
-        
-        for row, order in enumerate(orders):
-            self.orders_table.setItem(row, 0, QTableWidgetItem(str(order[0])))  # Номер заказа
-            self.orders_table.setItem(row, 1, QTableWidgetItem(order[1]))       # Состав заказа
-            self.orders_table.setItem(row, 2, QTableWidgetItem(order[2]))       # Дата заказа
-            self.orders_table.setItem(row, 3, QTableWidgetItem(order[3]))         # Дата доставки
-            self.orders_table.setItem(row, 4, QTableWidgetItem(str(order[4]))) # ID Пункта выдачи
-            self.orders_table.setItem(row, 5, QTableWidgetItem(order[5]))       # ФИО клиента
-            self.orders_table.setItem(row, 6, QTableWidgetItem(order[6]))       # Код для получения
-            self.orders_table.setItem(row, 7, QTableWidgetItem(order[7]))       # Статус заказа
-            
-            # Кнопка деталей заказа
-            details_button = QPushButton('Детали')
-            details_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #00FA9A;
-                    color: #333;
-                    border: none;
-                    padding: 4px 8px;
-                    border-radius: 3px;
-                    font-size: 10px;
-                    font-weight: bold;
-                    min-height: 22px;
-                    min-width: 60px;
-                    max-width: 80px;
-                }
-                QPushButton:hover {
-                    background-color: #7FFF00;
-                }
-            """)
-            details_button.clicked.connect(lambda checked, oid=order[0]: self.show_order_details(oid))
-            
-            self.orders_table.setCellWidget(row, 8, details_button)
+        """Запрашивает заказы в фоновом потоке"""
+        self.loading_label.show()
+        self.query_runner.submit('orders', self.db_manager.get_orders,
+                                 on_result=self.populate_orders,
+                                 on_error=lambda message: self.loading_label.hide())
+    
+    def populate_orders(self, orders):
+        """Передает полученные заказы в модель таблицы"""
+        self.loading_label.hide()
+        self.orders_model.set_records(orders)
+    
+    def on_orders_changed(self, event):
+        """Обновляет строки измененных заказов (после массовых изменений - весь список)"""
+        if event.ids is None:
+            self.load_orders()
+            return
+        for order_id in event.ids:
+            self.refresh_order(order_id)
+    
+    def refresh_order(self, order_id):
+        """Перечитывает один заказ и обновляет только его строку"""
+        order = self.db_manager.get_order(order_id)
+        if order is None:
+            self.orders_model.remove_record(order_id)
+        else:
+            self.orders_model.update_record(order)
     
     def show_order_details(self, order_id):
         """Показывает детали заказа"""
-        # Получаем данные заказа
-        order_data = self.db_manager.get_order_by_id(order_id)
-        if not order_data:
-            # Если заказ не найден в БД, используем данные из Excel
-            orders = self.db_manager.get_orders()
-            order_data = None
-            for order in orders:
-                if str(order[0]) == str(order_id):
-                    order_data = {
-                        'id': order[0],
-                        'client_name': order[5],
-                        'pickup_point_id': order[4],
-                        'total_amount': 0.0,
-                        'order_date': order[2],
-                        'delivery_date': order[3],
-                        'pickup_code': order[6],
-                        'status': order[7],
-                        'composition': order[1]
-                    }
-                    break
-        else:
-            # Преобразуем данные из БД в нужный формат
+        # Получаем данные заказа одним поиском по номеру (из БД или Excel)
+        order = self.db_manager.get_order(order_id)
+        order_data = None
+        if order:
             order_data = {
-                'id': order_data[0],
-                'user_id': order_data[1],
-                'pickup_point_id': order_data[2],
-                'status': order_data[3],
-                'total_amount': order_data[4],
-                'order_date': order_data[5],
-                'delivery_date': order_data[6] if order_data[6] else '',
-                'pickup_code': '',  # В БД нет этого поля
-                'client_name': 'Пользователь',  # В БД нет этого поля
-                'composition': 'Состав заказа'  # В БД нет этого поля
+                'id': order[0],
+                'client_name': order[5],
+                'pickup_point_id': order[4],
+                'order_date': order[2],
+                'delivery_date': order[3],
+                'pickup_code': order[6],
+                'status': order[7],
+                'composition': order[1]
             }
         
         if not order_data:
@@ -1424,7 +2553,6 @@ class OrdersWidget(QWidget):
                 self.db_manager.deleteorder(order_id)
                 QMessageBox.information(self, "Удалено", "Заказ успешно удален")
                 dialog.accept()
-                self.load_orders()
                 
         delete_button.clicked.connect(lambda checked=False, oid=order_id: delete_order(oid))
         button_layout.addWidget(delete_button)
@@ -1456,24 +2584,17 @@ class OrdersWidget(QWidget):
         try:
             # Обновляем статус заказа в базе данных
             new_status = self.status_combo.currentText()
-            self.db_manager.update_order_status(order_id, new_status)
-            
-            # Сохраняем изменения в кэш
-            if order_id not in self.db_manager.order_updates:
-                self.db_manager.order_updates[order_id] = {}
-            
-            self.db_manager.order_updates[order_id]['status'] = new_status
+            in_db = self.db_manager.update_order_status(order_id, new_status)
             
-            # Сохраняем другие изменения если они есть
-            if hasattr(self, 'delivery_date_input'):
-                self.db_manager.order_updates[order_id]['delivery_date'] = self.delivery_date_input.text()
-            
-            if hasattr(self, 'pickup_code_input'):
-                self.db_manager.order_updates[order_id]['pickup_code'] = self.pickup_code_input.text()
+            # Сохраняем изменения в базе, чтобы они пережили перезапуск
+            delivery_date = self.delivery_date_input.text() if hasattr(self, 'delivery_date_input') else None
+            pickup_code = self.pickup_code_input.text() if hasattr(self, 'pickup_code_input') else None
+            self.db_manager.save_order_updates(order_id, status=None if in_db else new_status,
+                                               delivery_date=delivery_date, pickup_code=pickup_code,
+                                               from_excel=not in_db)
             
             QMessageBox.information(self, 'Успех', 'Изменения сохранены')
             dialog.accept()
-            self.load_orders()  # Обновляем список заказов
         except Exception as e:
             QMessageBox.warning(self, 'Ошибка', f'Не удалось сохранить изменения: {str(e)}')
     
@@ -1508,8 +2629,8 @@ class OrdersWidget(QWidget):
         
         if dialog.exec_() == QDialog.Accepted:
             new_status = status_combo.currentText()
-            self.db_manager.update_order_status(order_id, new_status)
-            self.load_orders()
+            if not self.db_manager.update_order_status(order_id, new_status):
+                self.db_manager.save_order_updates(order_id, status=new_status, from_excel=True)
             QMessageBox.information(self, 'Успех', 'Статус заказа обновлен')
     
     def edit_order_dialog(self, order_id):
@@ -1641,16 +2762,17 @@ class OrdersWidget(QWidget):
                 pickup_code
             )
             
-            self.load_orders()
             QMessageBox.information(self, 'Успех', 'Заказ добавлен')
 
 class AdminWidget(QWidget):
     """Виджет администратора"""
     
-    def __init__(self, db_manager, catalog_widget=None, parent=None):
+    def __init__(self, db_manager, parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
-        self.catalog_widget = catalog_widget
+        self.query_runner = AsyncQueryRunner(self)
+        self.db_manager.changes.subscribe(ChangeEvent.BOOK, self.on_books_changed)
+        self.db_manager.changes.subscribe(ChangeEvent.USER, self.on_users_changed)
         self.init_ui()
     
     def init_ui(self):
@@ -1751,30 +2873,17 @@ class AdminWidget(QWidget):
         
         layout.addLayout(buttons_layout)
         
-        # Таблица книг
-        self.books_table = QTableWidget()
-        self.books_table.setColumnCount(8)
-        self.books_table.setHorizontalHeaderLabels([
-            'ID', 'Название', 'Автор', 'Жанр', 'Издательство', 'Цена', 'Количество', 'Действия'
-        ])
-        self.books_table.setStyleSheet("""
-            QTableWidget {
-                background-color: #FFFFFF;
-                border: 2px solid #7FFF00;
-                border-radius: 8px;
-                gridline-color: #7FFF00;
-            }
-            QHeaderView::section {
-                background-color: #7FFF00;
-                color: #333;
-                font-weight: bold;
-                padding: 8px;
-            }
-            QTableWidgetItem {
-                padding: 8px;
-            }
-        """)
-        
+        # Таблица книг (кнопки действий рисует делегат)
+        self.books_model = BookTableModel(self)
+        books_delegate = ActionButtonsDelegate([
+            ('edit', 'Редактировать', '#00FA9A', '#7FFF00', '#333'),
+            ('delete', 'Удалить', '#ff6b6b', '#ff5252', 'white'),
+        ], button_width=100)
+        books_delegate.clicked.connect(self.on_book_action)
+        self.books_table = create_records_table(self.books_model, books_delegate)
+        
+        self.books_loading_label = create_loading_label('Загрузка книг...')
+        layout.addWidget(self.books_loading_label)
         layout.addWidget(self.books_table)
         
         widget.setLayout(layout)
@@ -1829,30 +2938,17 @@ class AdminWidget(QWidget):
         
         layout.addLayout(buttons_layout)
         
-        # Таблица пользователей
-        self.users_table = QTableWidget()
-        self.users_table.setColumnCount(5)
-        self.users_table.setHorizontalHeaderLabels([
-            'ID', 'Логин', 'ФИО', 'Роль', 'Действия'
-        ])
-        self.users_table.setStyleSheet("""
-            QTableWidget {
-                background-color: #FFFFFF;
-                border: 2px solid #7FFF00;
-                border-radius: 8px;
-                gridline-color: #7FFF00;
-            }
-            QHeaderView::section {
-                background-color: #7FFF00;
-                color: #333;
-                font-weight: bold;
-                padding: 8px;
-            }
-            QTableWidgetItem {
-                padding: 8px;
-            }
-        """)
-        
+        # Таблица пользователей (кнопки действий рисует делегат)
+        self.users_model = UserTableModel(self)
+        users_delegate = ActionButtonsDelegate([
+            ('edit', 'Редактировать', '#00FA9A', '#7FFF00', '#333'),
+            ('delete', 'Удалить', '#ff6b6b', '#ff5252', 'white'),
+        ], button_width=100)
+        users_delegate.clicked.connect(self.on_user_action)
+        self.users_table = create_records_table(self.users_model, users_delegate)
+        
+        self.users_loading_label = create_loading_label('Загрузка пользователей...')
+        layout.addWidget(self.users_loading_label)
         layout.addWidget(self.users_table)
         
         widget.setLayout(layout)
@@ -1861,136 +2957,70 @@ class AdminWidget(QWidget):
     
     
     def load_books_table(self):
-        """Загружает книги в таблицу"""
-        books = self.db_manager.get_books()
-        
-        # Очищаем таблицу перед загрузкой
-        self.books_table.setRowCount(0)
-        self.books_table.setRowCount(len(books))
-        
-        for row, book in enumerate(books):
-            self.books_table.setItem(row, 0, QTableWidgetItem(str(book[0])))
-            self.books_table.setItem(row, 1, QTableWidgetItem(book[1]))
-            self.books_table.setItem(row, 2, QTableWidgetItem(book[2]))
-            self.books_table.setItem(row, 3, QTableWidgetItem(book[3]))
-            self.books_table.setItem(row, 4, QTableWidgetItem(book[4]))
-            try:
-                price = float(book[6])
-                self.books_table.setItem(row, 5, QTableWidgetItem(f"₽{price:.2f}"))
-            except (ValueError, TypeError):
-                self.books_table.setItem(row, 5, QTableWidgetItem(str(book[6])))
-            self.books_table.setItem(row, 6, QTableWidgetItem(str(book[7])))
-            
-            # Кнопки управления
-            button_layout = QHBoxLayout()
-            
-            edit_button = QPushButton('Редактировать')
-            edit_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #00FA9A;
-                    color: #333;
-                    border: none;
-                    padding: 4px 8px;
-                    border-radius: 3px;
-                    font-size: 10px;
-                    font-weight: bold;
-                    min-height: 22px;
-                    min-width: 70px;
-                    max-width: 85px;
-                }
-                QPushButton:hover {
-                    background-color: #7FFF00;
-                }
-            """)
-            edit_button.clicked.connect(lambda checked, bid=book[0]: self.edit_book_dialog(bid))
-            button_layout.addWidget(edit_button)
-            
-            delete_button = QPushButton('Удалить')
-            delete_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #ff6b6b;
-                    color: white;
-                    border: none;
-                    padding: 4px 8px;
-                    border-radius: 3px;
-                    font-size: 10px;
-                    font-weight: bold;
-                    min-height: 22px;
-                    min-width: 60px;
-                    max-width: 75px;
-                }
-                QPushButton:hover {
-                    background-color: #ff5252;
-                }
-            """)
-            delete_button.clicked.connect(lambda checked, bid=book[0]: self.delete_book(bid))
-            button_layout.addWidget(delete_button)
-            
-            button_widget = QWidget()
-            button_widget.setLayout(button_layout)
-            self.books_table.setCellWidget(row, 7, button_widget)
+        """Запрашивает книги в фоновом потоке"""
+        self.books_loading_label.show()
+        self.query_runner.submit('books', self.db_manager.get_books,
+                                 on_result=self.populate_books_table,
+                                 on_error=lambda message: self.books_loading_label.hide())
+    
+    def populate_books_table(self, books):
+        """Передает полученные книги в модель таблицы"""
+        self.books_loading_label.hide()
+        self.books_model.set_records(books)
+    
+    def on_book_action(self, action, book_id):
+        if action == 'edit':
+            self.edit_book_dialog(book_id)
+        elif action == 'delete':
+            self.delete_book(book_id)
+    
+    def on_books_changed(self, event):
+        if event.ids is None:
+            self.load_books_table()
+            return
+        for book_id in event.ids:
+            self.refresh_book(book_id)
+    
+    def refresh_book(self, book_id):
+        """Перечитывает одну книгу и обновляет ее строку"""
+        book = self.db_manager.get_book_row(book_id)
+        if book is None:
+            self.books_model.remove_record(book_id)
+        else:
+            self.books_model.update_record(book)
     
     def load_users_table(self):
-        """Загружает пользователей в таблицу"""
-        users = self.db_manager.get_users()
-        
-        self.users_table.setRowCount(len(users))
-        
-        for row, user in enumerate(users):
-            self.users_table.setItem(row, 0, QTableWidgetItem(str(user[0])))
-            self.users_table.setItem(row, 1, QTableWidgetItem(user[1]))
-            self.users_table.setItem(row, 2, QTableWidgetItem(user[2]))
-            self.users_table.setItem(row, 3, QTableWidgetItem(user[3]))
-            
-            # Кнопки управления
-            button_layout = QHBoxLayout()
-            
-            edit_button = QPushButton('Редактировать')
-            edit_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #00FA9A;
-                    color: #333;
-                    border: none;
-                    padding: 4px 8px;
-                    border-radius: 3px;
-                    font-size: 10px;
-                    font-weight: bold;
-                    min-height: 22px;
-                    min-width: 70px;
-                    max-width: 85px;
-                }
-                QPushButton:hover {
-                    background-color: #7FFF00;
-                }
-            """)
-            edit_button.clicked.connect(lambda checked, uid=user[0]: self.edit_user_dialog(uid))
-            button_layout.addWidget(edit_button)
-            
-            delete_button = QPushButton('Удалить')
-            delete_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #ff6b6b;
-                    color: white;
-                    border: none;
-                    padding: 4px 8px;
-                    border-radius: 3px;
-                    font-size: 10px;
-                    font-weight: bold;
-                    min-height: 22px;
-                    min-width: 60px;
-                    max-width: 75px;
-                }
-                QPushButton:hover {
-                    background-color: #ff5252;
-                }
-            """)
-            delete_button.clicked.connect(lambda checked, uid=user[0]: self.delete_user(uid))
-            button_layout.addWidget(delete_button)
-            
-            button_widget = QWidget()
-            button_widget.setLayout(button_layout)
-            self.users_table.setCellWidget(row, 4, button_widget)
-    
+        """Запрашивает пользователей в фоновом потоке"""
+        self.users_loading_label.show()
+        self.query_runner.submit('users', self.db_manager.get_users,
+                                 on_result=self.populate_users_table,
+                                 on_error=lambda message: self.users_loading_label.hide())
+    
+    def populate_users_table(self, users):
+        """Передает полученных пользователей в модель таблицы"""
+        self.users_loading_label.hide()
+        self.users_model.set_records(users)
+    
+    def on_user_action(self, action, user_id):
+        if action == 'edit':
+            self.edit_user_dialog(user_id)
+        elif action == 'delete':
+            self.delete_user(user_id)
+    
+    def on_users_changed(self, event):
+        if event.ids is None:
+            self.load_users_table()
+            return
+        for user_id in event.ids:
+            self.refresh_user(user_id)
+    
+    def refresh_user(self, user_id):
+        """Перечитывает одного пользователя и обновляет его строку"""
+        user = self.db_manager.get_user_row(user_id)
+        if user is None:
+            self.users_model.remove_record(user_id)
+        else:
+            self.users_model.update_record(user)
     
     def add_book_dialog(self):
         """Диалог добавления книги"""
@@ -2078,38 +3108,29 @@ class AdminWidget(QWidget):
                     return
             
             # Добавляем книгу
-            self.db_manager.add_book(
-                title_input.text().strip(),
-                author_input.text().strip(),
-                genre_id,
-                publisher_id,
-                year_input.value(),
-                price,
-                stock_input.value(),
-                is_on_sale,
-                discount_price,
-                'placeholder.png',
-                description_input.toPlainText().strip()
-            )
-            self.load_books_table()
-            # Обновляем каталог если он есть
-            if self.catalog_widget:
-                self.catalog_widget.load_books()
+            try:
+                self.db_manager.add_book(
+                    title_input.text().strip(),
+                    author_input.text().strip(),
+                    genre_id,
+                    publisher_id,
+                    year_input.value(),
+                    price,
+                    stock_input.value(),
+                    is_on_sale,
+                    discount_price,
+                    'placeholder.png',
+                    description_input.toPlainText().strip()
+                )
+            except sqlite3.IntegrityError:
+                QMessageBox.warning(self, 'Ошибка', 'Книга с таким названием и автором уже есть в каталоге')
+                return
             QMessageBox.information(self, 'Успех', 'Книга добавлена')
     
     def edit_book_dialog(self, book_id):
         """Диалог редактирования книги"""
         # Получаем данные книги
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT b.title, b.author, b.year, b.price, b.stock_quantity,
-                     b.is_on_sale, b.discount_price, b.description, b.genre_id, b.publisher_id, b.cover_image
-            FROM books b WHERE b.id = ?
-        ''', (book_id,))
-        
-        book_data = cursor.fetchone()
-        conn.close()
+        book_data = self.db_manager.get_book(book_id)
         
         if not book_data:
             QMessageBox.warning(self, 'Ошибка', 'Книга не найдена')
@@ -2180,24 +3201,24 @@ class AdminWidget(QWidget):
             publisher_id = publishers[publisher_combo.currentIndex()][0]
             
             # Обновляем книгу
-            self.db_manager.update_book(
-                book_id,
-                title_input.text().strip(),
-                author_input.text().strip(),
-                genre_id,
-                publisher_id,
-                year_input.value(),
-                float(price_input.text()),
-                stock_input.value(),
-                sale_checkbox.isChecked(),
-                float(discount_input.text()) if discount_input.text().strip() else None,
-                current_cover_image,  # Сохраняем текущую обложку
-                description_input.toPlainText().strip()
-            )
-            self.load_books_table()
-            # Обновляем каталог если он есть
-            if self.catalog_widget:
-                self.catalog_widget.load_books()
+            try:
+                self.db_manager.update_book(
+                    book_id,
+                    title_input.text().strip(),
+                    author_input.text().strip(),
+                    genre_id,
+                    publisher_id,
+                    year_input.value(),
+                    float(price_input.text()),
+                    stock_input.value(),
+                    sale_checkbox.isChecked(),
+                    float(discount_input.text()) if discount_input.text().strip() else None,
+                    current_cover_image,  # Сохраняем текущую обложку
+                    description_input.toPlainText().strip()
+                )
+            except sqlite3.IntegrityError:
+                QMessageBox.warning(self, 'Ошибка', 'Книга с таким названием и автором уже есть в каталоге')
+                return
             QMessageBox.information(self, 'Успех', 'Книга обновлена')
     
     def delete_book(self, book_id):
@@ -2210,10 +3231,6 @@ class AdminWidget(QWidget):
         
         if reply == QMessageBox.Yes:
             self.db_manager.delete_book(book_id)
-            self.load_books_table()
-            # Обновляем каталог если он есть
-            if self.catalog_widget:
-                self.catalog_widget.load_books()
             QMessageBox.information(self, 'Успех', 'Книга удалена')
     
     def add_user_dialog(self):
@@ -2253,7 +3270,6 @@ class AdminWidget(QWidget):
                 full_name_input.text().strip(),
                 role_combo.currentText()
             )
-            self.load_users_table()
             QMessageBox.information(self, 'Успех', 'Пользователь добавлен')
     
     def edit_user_dialog(self, user_id):
@@ -2270,7 +3286,6 @@ class AdminWidget(QWidget):
         
         if reply == QMessageBox.Yes:
             self.db_manager.delete_user(user_id)
-            self.load_users_table()
             QMessageBox.information(self, 'Успех', 'Пользователь удален')
     
     
@@ -2302,6 +3317,7 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.current_user = None
         self.db_manager = DatabaseManager()
+        self.db_manager.start_change_watcher()
         self.init_ui()
     
     def init_ui(self):
@@ -2345,8 +3361,7 @@ class MainWindow(QMainWindow):
     
     def show_main_window(self):
         """Показывает главное окно после авторизации"""
-        if self.main_widget:
-            self.stacked_widget.removeWidget(self.main_widget)
+        self.close_main_widget()
         
         self.main_widget = QWidget()
         main_layout = QVBoxLayout()
@@ -2450,7 +3465,7 @@ class MainWindow(QMainWindow):
             
             self.catalog_widget = CatalogWidget(self.db_manager, self.current_user['role'])
             self.orders_widget = OrdersWidget(self.db_manager, self.current_user['role'])
-            self.admin_widget = AdminWidget(self.db_manager, self.catalog_widget)
+            self.admin_widget = AdminWidget(self.db_manager)
             
             tab_widget.addTab(self.catalog_widget, 'Каталог книг')
             tab_widget.addTab(self.orders_widget, 'Заказы')
@@ -2462,10 +3477,18 @@ class MainWindow(QMainWindow):
         self.stacked_widget.addWidget(self.main_widget)
         self.stacked_widget.setCurrentWidget(self.main_widget)
     
+    def close_main_widget(self):
+        """Удаляет главный экран прошлого входа вместе с его подписками на изменения"""
+        if self.main_widget:
+            self.stacked_widget.removeWidget(self.main_widget)
+            self.main_widget.deleteLater()
+            self.main_widget = None
+    
     def logout(self):
         """Выход из системы"""
         self.current_user = None
         self.stacked_widget.setCurrentWidget(self.login_window)
+        self.close_main_widget()
 
 def main():
     app = QApplication(sys.argv)
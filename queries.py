@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Реестр SQL запросов системы "Книжный Мир".
+
+Все запросы DatabaseManager заданы здесь под именами, включая все варианты
+запроса каталога (поиск, жанр, сортировка, страница). Тексты запросов не
+меняются от вызова к вызову, поэтому sqlite3 компилирует каждый из них
+один раз на соединение пула и дальше берет из кэша подготовленных выражений.
+"""
+
+import time
+import sqlite3
+import threading
+from itertools import product
+
+# Колонки сортировки каталога: (выражение, направление)
+BOOK_SORT_COLUMNS = {
+    'title': ('b.title', 'ASC'),
+    'author': ('b.author', 'ASC'),
+    'price': ('b.price', 'ASC'),
+    'year': ('b.year', 'DESC'),
+    'relevance': ('s.rank', 'ASC'),
+}
+
+# Варианты поиска в каталоге: без поиска, FTS5, по началу слов через индексы, LIKE
+SEARCH_MODES = (None, 'fts', 'prefix', 'like')
+
+# Выборка книги в формате каталога и таблицы администратора.
+# extra_columns - колонки перед b.id (например, значение сортировки для страницы)
+BOOKS_SELECT = '''
+            SELECT {extra_columns}b.id, b.title, b.author, g.name as genre, p.name as publisher,
+                   b.year, b.price, b.stock_quantity, b.is_on_sale, b.discount_price,
+                   b.cover_image, b.description
+            FROM books b
+            JOIN genres g ON b.genre_id = g.id
+            JOIN publishers p ON b.publisher_id = p.id
+        '''
+
+ORDERS_SELECT = '''
+                SELECT o.id, o.user_id, o.pickup_point_id, o.status, o.total_amount,
+                       o.order_date, o.completion_date, u.full_name, o.pickup_code,
+                       (SELECT group_concat(COALESCE(b.article, b.title) || ', ' || oi.quantity, ', ')
+                        FROM order_items oi
+                        JOIN books b ON oi.book_id = b.id
+                        WHERE oi.order_id = o.id) AS composition,
+                       COALESCE(ov.delivery_date, ex.delivery_date), COALESCE(ov.pickup_code, ex.pickup_code),
+                       COALESCE(ov.client_name, ex.client_name), COALESCE(ov.composition, ex.composition)
+                FROM orders o
+                LEFT JOIN users u ON o.user_id = u.id
+                LEFT JOIN order_overrides ov ON ov.order_id = o.id
+                LEFT JOIN excel_order_overrides ex ON ex.external_number = o.external_number
+                {where}
+                ORDER BY o.id DESC
+            '''
+
+# Правки заказов из базы (order_overrides) и из Excel (excel_order_overrides)
+ORDER_OVERRIDES_SELECT = '''
+                SELECT {key}, status, delivery_date, pickup_code, client_name, composition
+                FROM {table}
+            '''
+
+ORDER_OVERRIDES_UPSERT = '''
+                INSERT INTO {table} ({key}, status, delivery_date, pickup_code,
+                                     client_name, composition)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT({key}) DO UPDATE SET
+                    status = COALESCE(excluded.status, status),
+                    delivery_date = COALESCE(excluded.delivery_date, delivery_date),
+                    pickup_code = COALESCE(excluded.pickup_code, pickup_code),
+                    client_name = COALESCE(excluded.client_name, client_name),
+                    composition = COALESCE(excluded.composition, composition),
+                    updated_at = CURRENT_TIMESTAMP
+            '''
+
+STATEMENTS = {
+    'users.authenticate': '''
+                SELECT id, full_name, role FROM users
+                WHERE login = ? AND password = ?
+            ''',
+    'users.list': 'SELECT id, login, full_name, role FROM users ORDER BY role, full_name',
+    'users.get': 'SELECT id, login, full_name, role FROM users WHERE id = ?',
+    'users.insert': '''
+                INSERT INTO users (login, password, full_name, role)
+                VALUES (?, ?, ?, ?)
+            ''',
+    'users.update': '''
+                UPDATE users SET login=?, password=?, full_name=?, role=?
+                WHERE id=?
+            ''',
+    'users.delete': 'DELETE FROM users WHERE id = ?',
+    'genres.list': 'SELECT id, name FROM genres ORDER BY name',
+    'genres.insert': 'INSERT INTO genres (name) VALUES (?)',
+    'publishers.list': 'SELECT id, name FROM publishers ORDER BY name',
+    'publishers.insert': 'INSERT INTO publishers (name) VALUES (?)',
+    'books.get': BOOKS_SELECT.format(extra_columns='') + ' WHERE b.id = ?',
+    'books.exists': 'SELECT id FROM books WHERE id = ?',
+    'books.edit_data': '''
+                SELECT b.title, b.author, b.year, b.price, b.stock_quantity,
+                         b.is_on_sale, b.discount_price, b.description, b.genre_id, b.publisher_id, b.cover_image
+                FROM books b WHERE b.id = ?
+            ''',
+    'books.insert': '''
+                INSERT INTO books (title, author, genre_id, publisher_id, year, price,
+                                 stock_quantity, is_on_sale, discount_price, cover_image, description,
+                                 title_norm, author_norm)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''',
+    'books.update': '''
+                UPDATE books SET title=?, author=?, genre_id=?, publisher_id=?, year=?,
+                               price=?, stock_quantity=?, is_on_sale=?, discount_price=?,
+                               cover_image=?, description=?, title_norm=?, author_norm=?
+                WHERE id=?
+            ''',
+    'books.delete': 'DELETE FROM books WHERE id = ?',
+    'orders.list': ORDERS_SELECT.format(where=''),
+    'orders.get': ORDERS_SELECT.format(where='WHERE o.id = ?'),
+    'orders.get_raw': '''
+                SELECT id, user_id, pickup_point_id, status, total_amount, order_date, completion_date
+                FROM orders WHERE id = ?
+            ''',
+    'orders.insert': '''
+            INSERT INTO orders (user_id, pickup_point_id, total_amount, order_date, completion_date, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''',
+    'orders.update_status': '''
+                UPDATE orders SET status = ? WHERE id = ?
+            ''',
+    'orders.delete': 'DELETE FROM orders WHERE id = ?',
+    'order_items.list': '''
+            SELECT b.title, oi.quantity, oi.price
+            FROM order_items oi
+            JOIN books b ON oi.book_id = b.id
+            WHERE oi.order_id = ?
+        ''',
+    'order_items.insert': '''
+            INSERT INTO order_items (order_id, book_id, quantity, price)
+            VALUES (?, ?, ?, ?)
+        ''',
+    'order_items.delete': 'DELETE FROM order_items WHERE order_id = ?',
+    'order_overrides.upsert': ORDER_OVERRIDES_UPSERT.format(table='order_overrides', key='order_id'),
+    'order_overrides.delete': 'DELETE FROM order_overrides WHERE order_id = ?',
+    'excel_order_overrides.upsert': ORDER_OVERRIDES_UPSERT.format(table='excel_order_overrides',
+                                                                  key='external_number'),
+    'excel_order_overrides.list': ORDER_OVERRIDES_SELECT.format(table='excel_order_overrides',
+                                                                key='external_number'),
+    'excel_order_overrides.get': ORDER_OVERRIDES_SELECT.format(table='excel_order_overrides',
+                                                               key='external_number') + ' WHERE external_number = ?',
+    'excel_imports.exists': 'SELECT 1 FROM excel_imports WHERE source = ?',
+}
+
+def book_query_name(kind, search_mode, genre, sort_by, after=False):
+    """Имя варианта запроса каталога.
+
+    kind - 'list' (весь список) или 'page' (страница по ключу), sort_by - ключ
+    BOOK_SORT_COLUMNS или None (без сортировки по колонке).
+    """
+    parts = ['books', kind, search_mode or 'all', 'genre' if genre else 'any', sort_by or 'none']
+    if after:
+        parts.append('after')
+    return '.'.join(parts)
+
+def build_books_sql(kind, search_mode, genre, sort_by, after=False):
+    """Собирает текст одного варианта запроса каталога.
+
+    Параметры идут в порядке: поиск, жанр, затем для страницы ключ и LIMIT.
+    """
+    if kind == 'page':
+        # Значение сортировки выбираем первой колонкой, чтобы построить ключ страницы
+        column, direction = BOOK_SORT_COLUMNS[sort_by]
+        query = BOOKS_SELECT.format(extra_columns=f'{column} AS sort_value, ')
+        assert f'SELECT {column} AS sort_value, b.id,' in query, 'ключ страницы должен идти перед b.id'
+    else:
+        query = BOOKS_SELECT.format(extra_columns='')
+
+    if search_mode == 'fts':
+        # Поиск по полнотекстовому индексу, название и автор весят больше описания
+        query += '''
+            JOIN (SELECT rowid, bm25(books_fts, 10.0, 5.0, 1.0) AS rank
+                  FROM books_fts WHERE books_fts MATCH ?) s ON s.rowid = b.id
+            '''
+
+    # Из повторяющихся книг (одинаковые название и автор) показываем самую раннюю
+    query += '''
+            WHERE NOT EXISTS (SELECT 1 FROM books d
+                              WHERE d.title_norm = b.title_norm AND d.author_norm = b.author_norm
+                                AND d.id < b.id)
+        '''
+
+    if search_mode == 'prefix':
+        # Без FTS5 ищем по началу нормализованных названия и автора (через индексы)
+        query += ''' AND ((b.title_norm >= ? AND b.title_norm < ?)
+                          OR (b.author_norm >= ? AND b.author_norm < ?))'''
+    elif search_mode == 'like':
+        # В строке нет ни одного слова - обычный поиск по подстроке
+        query += ' AND (b.title LIKE ? OR b.author LIKE ?)'
+
+    if genre:
+        query += ' AND g.name = ?'
+
+    if kind == 'page':
+        if after:
+            # Продолжаем сразу после последней показанной книги, без OFFSET
+            operator = '>' if direction == 'ASC' else '<'
+            query += f' AND ({column}, b.id) {operator} (?, ?)'
+        query += f' ORDER BY {column} {direction}, b.id {direction} LIMIT ?'
+        return query
+
+    # Сортировка (при поиске совпадающие позиции упорядочиваются по релевантности)
+    order_by = []
+    if sort_by:
+        column, direction = BOOK_SORT_COLUMNS[sort_by]
+        order_by.append(f'{column} {direction}')
+    if search_mode == 'fts':
+        order_by.append('s.rank')
+    if order_by:
+        query += ' ORDER BY ' + ', '.join(order_by)
+    return query
+
+def book_statements():
+    """Перебирает все варианты запроса каталога: {имя: текст}"""
+    statements = {}
+    list_sorts = [name for name in BOOK_SORT_COLUMNS if name != 'relevance'] + [None]
+    for search_mode, genre, sort_by in product(SEARCH_MODES, (False, True), list_sorts):
+        name = book_query_name('list', search_mode, genre, sort_by)
+        statements[name] = build_books_sql('list', search_mode, genre, sort_by)
+    for search_mode, genre, sort_by, after in product(SEARCH_MODES, (False, True), BOOK_SORT_COLUMNS,
+                                                      (False, True)):
+        if sort_by == 'relevance' and search_mode != 'fts':
+            continue  # Релевантность есть только у полнотекстового поиска
+        name = book_query_name('page', search_mode, genre, sort_by, after)
+        statements[name] = build_books_sql('page', search_mode, genre, sort_by, after)
+    return statements
+
+class QueryRegistry:
+    """Именованные запросы с метриками по каждому запросу.
+
+    Соединения пула открываются с кэшем выражений не меньше cache_size,
+    чтобы ни один зарегистрированный запрос не вытеснялся из кэша.
+    """
+
+    SPARE_STATEMENTS = 32  # Место в кэше для PRAGMA и служебных запросов
+
+    def __init__(self, statements=None):
+        self.statements = {}
+        self.metrics = {}
+        self._lock = threading.Lock()
+        for name, sql in (statements or {}).items():
+            self.register(name, sql)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def __contains__(self, name):
+        return name in self.statements
+
+    @property
+    def cache_size(self):
+        return len(self.statements) + self.SPARE_STATEMENTS
+
+    def register(self, name, sql):
+        """Добавляет запрос под новым именем"""
+        if name in self.statements:
+            raise ValueError(f"Запрос {name} уже зарегистрирован")
+        self.statements[name] = sql
+        self.metrics[name] = {'calls': 0, 'errors': 0, 'rows': 0, 'time_total': 0.0, 'time_max': 0.0}
+
+    def sql(self, name):
+        try:
+            return self.statements[name]
+        except KeyError:
+            raise KeyError(f"Неизвестный запрос: {name}") from None
+
+    def record(self, name, elapsed, rows=0, failed=False):
+        with self._lock:
+            metrics = self.metrics[name]
+            metrics['calls'] += 1
+            metrics['rows'] += max(rows, 0)
+            metrics['time_total'] += elapsed
+            metrics['time_max'] = max(metrics['time_max'], elapsed)
+            if failed:
+                metrics['errors'] += 1
+
+    def run(self, conn, name, params, fetch):
+        """Выполняет запрос и замеряет время вместе с чтением результата"""
+        sql = self.sql(name)
+        started = time.perf_counter()
+        try:
+            cursor = conn.execute(sql, params)
+            result = fetch(cursor)
+        except sqlite3.Error:
+            self.record(name, time.perf_counter() - started, failed=True)
+            raise
+        if isinstance(result, list):
+            rows = len(result)
+        elif result is cursor:
+            rows = cursor.rowcount
+        else:
+            rows = int(result is not None)
+        self.record(name, time.perf_counter() - started, rows)
+        return result
+
+    def execute(self, conn, name, params=()):
+        """Выполняет запрос на соединении или курсоре и возвращает курсор"""
+        return self.run(conn, name, params, lambda cursor: cursor)
+
+    def fetchall(self, conn, name, params=()):
+        return self.run(conn, name, params, lambda cursor: cursor.fetchall())
+
+    def fetchone(self, conn, name, params=()):
+        return self.run(conn, name, params, lambda cursor: cursor.fetchone())
+
+    def executemany(self, cursor, name, seq_of_params):
+        sql = self.sql(name)
+        started = time.perf_counter()
+        try:
+            cursor.executemany(sql, seq_of_params)
+        except sqlite3.Error:
+            self.record(name, time.perf_counter() - started, failed=True)
+            raise
+        self.record(name, time.perf_counter() - started, cursor.rowcount)
+        return cursor
+
+    def stats(self):
+        """Метрики вызывавшихся запросов, самые затратные первыми"""
+        with self._lock:
+            used = [(name, dict(metrics)) for name, metrics in self.metrics.items() if metrics['calls']]
+        for name, metrics in used:
+            metrics['time_avg'] = metrics['time_total'] / metrics['calls']
+        used.sort(key=lambda item: item[1]['time_total'], reverse=True)
+        return dict(used)
+
+def create_registry():
+    """Реестр со всеми запросами DatabaseManager"""
+    statements = dict(STATEMENTS)
+    statements.update(book_statements())
+    return QueryRegistry(statements)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Настройки хранения базы данных "Книжный Мир": режим журнала, PRAGMA соединений
+и фоновые контрольные точки WAL.
+
+В режиме WAL читатели не блокируются записью, поэтому несколько копий приложения
+могут работать с одной базой одновременно. WAL требует, чтобы все копии работали
+на одном компьютере (база не должна лежать на сетевом диске).
+"""
+
+import os
+import json
+import sqlite3
+import threading
+
+SETTINGS_FILE = 'storage.json'
+
+class StorageSettings:
+    """Параметры хранения. Значения по умолчанию можно переопределить в storage.json"""
+
+    DEFAULTS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # В режиме WAL безопасно: теряются только последние транзакции при сбое питания
+        'cache_size_kb': 16384,  # Кэш страниц на одно соединение
+        'mmap_size': 64 * 1024 * 1024,  # Чтение файла базы через отображение в память
+        'temp_store': 'MEMORY',  # Временные таблицы и сортировки в памяти
+        'busy_timeout_ms': 30000,  # Сколько ждать освобождения блокировки записи
+        'wal_autocheckpoint': 1000,  # Автоматическая контрольная точка (страниц), 0 - отключить
+        'checkpoint_interval': 30.0,  # Период проверки размера WAL фоновым потоком, секунд
+        'checkpoint_wal_bytes': 4 * 1024 * 1024,  # Размер WAL, после которого выполняется PASSIVE
+        'truncate_wal_bytes': 64 * 1024 * 1024,  # Размер WAL, после которого файл усекается (TRUNCATE)
+    }
+
+    def __init__(self, **overrides):
+        unknown = set(overrides) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Неизвестные настройки хранения: {', '.join(sorted(unknown))}")
+        values = dict(self.DEFAULTS)
+        values.update(overrides)
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def load(cls, path=SETTINGS_FILE):
+        """Читает настройки из JSON файла, если он есть"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                overrides = json.load(f)
+            return cls(**overrides)
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Не удалось прочитать настройки хранения {path}: {e}")
+            return cls()
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.DEFAULTS}
+
+def configure_connection(conn, settings):
+    """Применяет к соединению PRAGMA, которые действуют только на него"""
+    conn.execute(f'PRAGMA busy_timeout = {int(settings.busy_timeout_ms)}')
+    conn.execute(f'PRAGMA synchronous = {settings.synchronous}')
+    conn.execute(f'PRAGMA cache_size = {-int(settings.cache_size_kb)}')
+    conn.execute(f'PRAGMA mmap_size = {int(settings.mmap_size)}')
+    conn.execute(f'PRAGMA temp_store = {settings.temp_store}')
+    conn.execute(f'PRAGMA wal_autocheckpoint = {int(settings.wal_autocheckpoint)}')
+
+def enable_journal_mode(conn, settings):
+    """Переключает режим журнала базы (сохраняется в файле базы).
+
+    Возвращает установленный режим: если базу держат открытой другие
+    соединения, режим может остаться прежним.
+    """
+    mode = conn.execute(f'PRAGMA journal_mode = {settings.journal_mode}').fetchone()[0]
+    if mode.lower() != settings.journal_mode.lower():
+        print(f"Режим журнала {settings.journal_mode} не включен, текущий режим: {mode}")
+    return mode
+
+class Checkpointer:
+    """Фоновый поток, который переносит WAL в файл базы по порогам размера.
+
+    Пока WAL меньше checkpoint_wal_bytes, ничего не делается. Выше порога
+    выполняется PASSIVE (не мешает читателям и писателям), если с прошлой
+    полной контрольной точки в WAL что-то записали: сам файл после PASSIVE
+    не уменьшается. TRUNCATE, который уменьшает файл, выполняется при
+    truncate_wal_bytes и только если PASSIVE перенес все кадры.
+    """
+
+    # TRUNCATE держит блокировку записи, пока ждет читателей, поэтому долго не ждем
+    BUSY_TIMEOUT = 0.1
+
+    def __init__(self, db_path, settings):
+        self.db_path = db_path
+        self.wal_path = db_path + '-wal'
+        self.settings = settings
+        self._stop = threading.Event()
+        self._thread = None
+        self.checkpointed_state = None  # (размер, время изменения) WAL после полной контрольной точки
+        self.metrics = {'checks': 0, 'checkpoints': 0, 'truncates': 0, 'busy': 0, 'skipped': 0,
+                        'pages_checkpointed': 0, 'last_wal_bytes': 0}
+
+    def start(self):
+        if self._thread is not None or self.settings.journal_mode.lower() != 'wal':
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='wal-checkpointer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT)
+        try:
+            while not self._stop.wait(self.settings.checkpoint_interval):
+                self.check(conn)
+        finally:
+            conn.close()
+
+    def wal_size(self):
+        try:
+            return os.path.getsize(self.wal_path)
+        except OSError:
+            return 0
+
+    def wal_state(self):
+        try:
+            stat = os.stat(self.wal_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def check(self, conn):
+        """Выполняет контрольную точку, если WAL превысил порог"""
+        self.metrics['checks'] += 1
+        size = self.wal_size()
+        self.metrics['last_wal_bytes'] = size
+        if size < self.settings.checkpoint_wal_bytes:
+            return None
+        state = self.wal_state()
+        if state == self.checkpointed_state:
+            # Все кадры уже перенесены, а новых записей не было
+            self.metrics['skipped'] += 1
+            return None
+
+        result = self.checkpoint(conn, 'PASSIVE')
+        if result is None:
+            return None
+        busy, log_pages, checkpointed = result
+        if busy or log_pages < 0 or checkpointed < log_pages:
+            return result  # Кадры, которые еще читают, перенесем в следующий раз
+
+        if size >= self.settings.truncate_wal_bytes:
+            # Переносить уже нечего, TRUNCATE только усекает файл
+            truncated = self.checkpoint(conn, 'TRUNCATE')
+            if truncated is None or truncated[0]:
+                return truncated or result  # Помешали читатели - попробуем в следующий раз
+            result = truncated
+        self.checkpointed_state = self.wal_state()
+        return result
+
+    def checkpoint(self, conn, mode='PASSIVE'):
+        """Возвращает (занято ли, страниц в WAL, перенесено страниц)"""
+        try:
+            busy, log_pages, checkpointed = conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+        except sqlite3.Error as e:
+            print(f"Ошибка контрольной точки WAL: {e}")
+            return None
+        self.metrics['checkpoints'] += 1
+        if mode == 'TRUNCATE':
+            self.metrics['truncates'] += 1
+        if busy:
+            self.metrics['busy'] += 1
+        self.metrics['pages_checkpointed'] += max(checkpointed, 0)
+        return busy, log_pages, checkpointed
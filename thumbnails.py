@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Подготовка миниатюр обложек для каталога "Книжный Мир"
+Запуск: python thumbnails.py [файл обложки ...]
+"""
+
+import os
+import sys
+import json
+import hashlib
+import threading
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage
+
+IMAGE_DIR = "Модуль 1/Прил_2_ОЗ_КОД 09.02.07-2-2026-М1"
+THUMBNAIL_DIR = 'thumbnails'
+THUMBNAIL_SIZE = (116, 156)  # Размер обложки в карточке каталога
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+class ThumbnailStore:
+    """Хранилище миниатюр, адресуемых по содержимому исходного файла.
+
+    Имя миниатюры состоит из хеша исходного файла и размера. Индекс хранит
+    mtime и размер источника, чтобы не пересчитывать хеш неизмененных файлов.
+    """
+
+    def __init__(self, cache_dir=THUMBNAIL_DIR, image_dir=IMAGE_DIR):
+        self.cache_dir = cache_dir
+        self.image_dir = image_dir
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self._lock = threading.Lock()
+        self.index = self.load_index()
+
+    def load_index(self):
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            data = json.dumps(self.index, ensure_ascii=False, indent=1)
+        tmp_path = f"{self.index_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def file_hash(path):
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def fingerprint(self, image_filename):
+        """Возвращает хеш содержимого обложки или None, если файла нет"""
+        path = os.path.join(self.image_dir, image_filename)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self.index.get(image_filename)
+        if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['hash']
+
+        # Файл новый или изменился — пересчитываем хеш
+        digest = self.file_hash(path)
+        with self._lock:
+            self.index[image_filename] = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'hash': digest}
+        self.save_index()
+        return digest
+
+    def thumbnail_path(self, digest, width, height):
+        return os.path.join(self.cache_dir, f"{digest}_{width}x{height}.png")
+
+    def render(self, source_path, target_path, width, height):
+        """Уменьшает изображение и сохраняет миниатюру"""
+        image = QImage(source_path)
+        if image.isNull():
+            return False
+        image = image.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{target_path}.{threading.get_ident()}.tmp"
+        if not image.save(tmp_path, 'PNG'):
+            return False
+        os.replace(tmp_path, target_path)
+        return True
+
+    def get(self, image_filename, width=THUMBNAIL_SIZE[0], height=THUMBNAIL_SIZE[1]):
+        """Возвращает путь к актуальной миниатюре, при необходимости создает ее"""
+        if not image_filename:
+            return None
+        digest = self.fingerprint(image_filename)
+        if digest is None:
+            return None
+        path = self.thumbnail_path(digest, width, height)
+        if not os.path.exists(path):
+            if not self.render(os.path.join(self.image_dir, image_filename), path, width, height):
+                return None
+        return path
+
+    def build(self, filenames=None, sizes=(THUMBNAIL_SIZE,)):
+        """Готовит миниатюры для файлов (по умолчанию для всех изображений каталога)"""
+        if filenames is None:
+            filenames = sorted(name for name in os.listdir(self.image_dir)
+                               if name.lower().endswith(IMAGE_EXTENSIONS))
+        created = 0
+        for image_filename in filenames:
+            for width, height in sizes:
+                if self.get(image_filename, width, height):
+                    created += 1
+                else:
+                    print(f"Не удалось подготовить миниатюру: {image_filename}")
+        return created
+
+    def prune(self):
+        """Удаляет миниатюры, на которые больше не ссылается индекс"""
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        with self._lock:
+            digests = {entry['hash'] for entry in self.index.values()}
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.png') and name.split('_', 1)[0] not in digests:
+                os.remove(os.path.join(self.cache_dir, name))
+                removed += 1
+        return removed
+
+def main():
+    store = ThumbnailStore()
+    created = store.build(sys.argv[1:] or None)
+    removed = store.prune()
+    print(f"Готово миниатюр: {created}, удалено устаревших: {removed}")
+
+if __name__ == "__main__":
+    main()